@@ -0,0 +1,30 @@
+'''Benchmark deleting a repository with many keys.
+
+Usage:
+    python -m benchmarks.deletes [number of keys]
+'''
+import sys
+import time
+from minerva_db.sql.api import Client
+from .common import scratch_session, report
+from .lists import peak_memory
+from .serializers import seed
+
+
+def main(n=500000):
+    with scratch_session() as session:
+        client = Client(session)
+        seed(session, n)
+        session.commit()
+
+        start = time.perf_counter()
+        memory = peak_memory(lambda: client.delete_repository(
+            'bench-repository'
+        ))
+        report(f'delete repository ({n} keys)',
+               time.perf_counter() - start, n)
+        print(f'{"  peak memory":<48} {memory / 2 ** 20:>10.1f} MiB')
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
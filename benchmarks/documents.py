@@ -0,0 +1,60 @@
+'''Benchmark building read documents in Python against building them in the
+database.
+
+Usage:
+    python -m benchmarks.documents [number of repositories]
+'''
+import json
+import sys
+from minerva_db.sql.api import Client
+from minerva_db.sql.models import (User, Group, Membership, Repository,
+                                   Grant, Image)
+from .common import scratch_session, timeit, report
+
+
+def seed(client, session, n):
+    user = User('bench-user')
+    group = Group('bench-group', 'bench-group')
+    repositories = [Repository(f'bench-repository-{i}', f'repository{i}')
+                    for i in range(n)]
+    session.add_all([user, group, Membership(group, user, 'Member')])
+    session.add_all(repositories)
+    session.add_all([Grant(user, repository, 'Read')
+                     for repository in repositories[::2]])
+    session.add_all([Grant(group, repository, 'Read')
+                     for repository in repositories[1::2]])
+    session.add(Image('bench-image', 'image', 1, 'tiff', 'zlib', 1024,
+                      repositories[0]))
+    session.commit()
+    for i in range(10):
+        client.create_rendering_settings(f'bench-settings-{i}', 'bench-image',
+                                         [], f'settings{i}')
+
+
+def main(n=1000):
+    with scratch_session() as session:
+        client = Client(session)
+        seed(client, session, n)
+
+        cases = [
+            ('get_image', ('bench-image',)),
+            ('get_membership', ('bench-group', 'bench-user')),
+            ('list_repositories_for_user', ('bench-user',)),
+            ('list_grants_for_repository', ('bench-repository-0',))
+        ]
+        for name, args in cases:
+            method = getattr(client, name)
+
+            def python():
+                session.expire_all()
+                json.dumps(method(*args))
+
+            def database():
+                method(*args, as_json=True)
+
+            for label, fn in (('python', python), ('database', database)):
+                report(f'{name} {label}', timeit(fn, repeat=20), 1)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
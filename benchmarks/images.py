@@ -0,0 +1,53 @@
+'''Benchmark registering the images of a fileset with a single statement
+against creating an `Image` object for each.
+
+Usage:
+    python -m benchmarks.images [number of images]
+'''
+import sys
+import time
+from minerva_db.sql.api import Client
+from minerva_db.sql.models import Repository, Import, Fileset, Image
+from .common import scratch_session, report
+
+
+def main(n=5000):
+    with scratch_session() as session:
+        client = Client(session)
+        repository = Repository('bench-repository', 'bench-repository')
+        import_ = Import('bench-import', 'bench-import', repository)
+        filesets = [Fileset(f'bench-fileset-{i}', f'fileset{i}', 'reader',
+                            'BioFormats', '1.0.0', import_, 100)
+                    for i in range(2)]
+        for fileset in filesets:
+            fileset.complete = True
+        session.add_all([repository, import_, *filesets])
+        session.commit()
+
+        def images(fileset):
+            return [{'uuid': f'{fileset}-image-{i}', 'name': f'image{i}',
+                     'pyramid_levels': 5, 'format': 'tiff',
+                     'compression': 'zlib', 'tile_size': 1024}
+                    for i in range(n)]
+
+        start = time.perf_counter()
+        fileset = session.query(Fileset).get('bench-fileset-0')
+        session.add_all([
+            Image(**image, fileset=fileset,
+                  repository=fileset.import_.repository)
+            for image in images('bench-fileset-0')
+        ])
+        session.commit()
+        report(f'register images as objects ({n} images)',
+               time.perf_counter() - start, n)
+
+        start = time.perf_counter()
+        client.add_images_to_fileset('bench-fileset-1',
+                                     images('bench-fileset-1'),
+                                     {'channels': []})
+        report(f'register images in bulk ({n} images, with settings)',
+               time.perf_counter() - start, n)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
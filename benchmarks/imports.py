@@ -0,0 +1,57 @@
+'''Benchmark the import time of the clients.
+
+Each module is imported in a fresh interpreter with `python -X importtime`
+and the slowest of the modules it imports are listed.
+
+Usage:
+    python -m benchmarks.imports [number of modules to list]
+'''
+import subprocess
+import sys
+from .common import report
+
+MODULES = ['minerva_db.sql.api', 'minerva_db.sql.api.client',
+           'minerva_db.sql.miniclient.miniclient']
+
+
+def importtime(module):
+    '''Import a module in a fresh interpreter.
+
+    Args:
+        module: Name of the module.
+
+    Returns:
+        The cumulative import time in seconds of each module imported, by
+        name.
+    '''
+
+    stderr = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        stderr=subprocess.PIPE, check=True, universal_newlines=True
+    ).stderr
+
+    times = {}
+    for line in stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = int(cumulative) / 1e6
+    return times
+
+
+def main(top=10):
+    for module in MODULES:
+        times = importtime(module)
+        report(module, times[module])
+        slowest = sorted(
+            ((seconds, name) for name, seconds in times.items()
+             if name != module),
+            reverse=True
+        )
+        for seconds, name in slowest[:top]:
+            report(f'  {name}', seconds)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
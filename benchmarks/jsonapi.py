@@ -0,0 +1,39 @@
+'''Benchmark encoding the keys of an import as a JSON:API document at once
+against streaming it.
+
+Usage:
+    python -m benchmarks.jsonapi [number of keys]
+'''
+import json
+import sys
+from itertools import chain
+from minerva_db.sql.api import Client
+from minerva_db.sql.api.utils import iter_jsonapi
+from .common import scratch_session, timeit, report
+from .lists import peak_memory
+from .serializers import seed
+
+
+def main(n=500000):
+    with scratch_session() as session:
+        client = Client(session)
+        seed(session, n)
+
+        def at_once():
+            json.dumps(client.list_keys_in_import('bench-import')).encode()
+
+        def streamed():
+            data = chain.from_iterable(
+                client.iter_keys_in_import('bench-import')
+            )
+            for _ in iter_jsonapi(data):
+                pass
+
+        for name, fn in (('at once', at_once), ('streamed', streamed)):
+            report(f'encode keys {name} ({n} keys)', timeit(fn, repeat=3), n)
+            print(f'{"  peak memory":<48} '
+                  f'{peak_memory(fn) / 2 ** 20:>10.1f} MiB')
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,37 @@
+'''Benchmark adding the keys of an import in batches against creating a
+`Key` object for each.
+
+Usage:
+    python -m benchmarks.keys [number of keys]
+'''
+import sys
+import time
+from minerva_db.sql.api import Client
+from minerva_db.sql.models import Repository, Import, Key
+from .common import scratch_session, report
+
+
+def main(n=100000):
+    with scratch_session() as session:
+        client = Client(session)
+        repository = Repository('bench-repository', 'bench-repository')
+        imports = [Import(f'bench-import-{i}', f'import{i}', repository)
+                   for i in range(2)]
+        session.add_all([repository, *imports])
+        session.commit()
+        keys = [f'bench-key-{i}' for i in range(n)]
+
+        start = time.perf_counter()
+        session.add_all([Key(key, import_=imports[0]) for key in keys])
+        session.commit()
+        report(f'add keys as objects ({n} keys)',
+               time.perf_counter() - start, n)
+
+        start = time.perf_counter()
+        client.add_keys_to_import(iter(keys), imports[1].uuid)
+        report(f'add keys in batches ({n} keys)',
+               time.perf_counter() - start, n)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
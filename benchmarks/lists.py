@@ -0,0 +1,56 @@
+'''Benchmark listing the keys of an import by loading objects against
+selecting only the serialized columns, and against iterating over them in
+chunks.
+
+Usage:
+    python -m benchmarks.lists [number of keys]
+'''
+import sys
+import tracemalloc
+from minerva_db.sql.api import Client
+from minerva_db.sql.models import Key
+from minerva_db.sql.serializers import compiled
+from .common import scratch_session, timeit, report
+from .serializers import seed
+
+
+def peak_memory(fn):
+    '''Peak memory allocated while calling a function, in bytes.'''
+
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def main(n=500000):
+    with scratch_session() as session:
+        client = Client(session)
+        seed(session, n)
+
+        def objects():
+            keys = session.query(Key) \
+                .filter(Key.import_uuid == 'bench-import') \
+                .all()
+            compiled.keys_schema.dump(keys)
+            session.expunge_all()
+
+        def columns():
+            client.list_keys_in_import('bench-import')
+
+        def chunks():
+            for _ in client.iter_keys_in_import('bench-import'):
+                pass
+
+        for name, fn in (('objects', objects), ('columns', columns),
+                         ('chunks', chunks)):
+            report(f'list_keys_in_import {name} ({n} keys)',
+                   timeit(fn, repeat=3), n)
+            print(f'{"  peak memory":<48} '
+                  f'{peak_memory(fn) / 2 ** 20:>10.1f} MiB')
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,84 @@
+'''Benchmark MiniClient cold start against the ORM Client.
+
+Each run is a fresh interpreter which imports the client, creates a scratch
+schema and then authorizes an image, as a cold Lambda invocation would. The
+schema is created after the import is timed, so it does not count towards
+the import, but any mapper configuration and statement preparation counts
+towards the first query.
+
+Usage:
+    python -m benchmarks.miniclient [number of runs]
+'''
+import json
+import subprocess
+import sys
+from .common import report
+
+WORKER = """
+import json
+import time
+start = time.perf_counter()
+{import_client}
+imported = time.perf_counter()
+
+from benchmarks.common import scratch_session
+with scratch_session() as session:
+    # Seeded without the ORM so the mappers are not yet configured
+    session.execute('''
+        INSERT INTO t_repository (uuid, name, raw_storage, access)
+        VALUES ('bench-repository', 'bench-repository', 'Archive', 'Private');
+        INSERT INTO t_image (uuid, name, pyramid_levels, deleted, tile_size,
+                             rgb, repository_uuid)
+        VALUES ('bench-image', 'image', 1, FALSE, 1024, FALSE,
+                'bench-repository')
+    ''')
+    client = {client}
+
+    start_query = time.perf_counter()
+    {authorize}
+    first = time.perf_counter() - start_query
+
+    start_query = time.perf_counter()
+    {authorize}
+    second = time.perf_counter() - start_query
+
+print(json.dumps({{
+    'import': imported - start,
+    'first': first,
+    'second': second
+}}))
+"""
+
+CLIENTS = {
+    'MiniClient': {
+        'import_client': 'from minerva_db.sql.miniclient.miniclient '
+                         'import MiniClient',
+        'client': 'MiniClient(session)',
+        'authorize': 'client.has_image_permission(None, "bench-image")'
+    },
+    'Client': {
+        'import_client': 'from minerva_db.sql.api import Client',
+        'client': 'Client(session)',
+        'authorize': 'client.has_permission(None, "Image", "bench-image", '
+                     '"Read")'
+    }
+}
+
+
+def run(client):
+    code = WORKER.format(**CLIENTS[client])
+    output = subprocess.run([sys.executable, '-c', code], check=True,
+                            stdout=subprocess.PIPE).stdout
+    return json.loads(output)
+
+
+def main(runs=5):
+    for client in CLIENTS:
+        results = [run(client) for _ in range(runs)]
+        for key in ('import', 'first', 'second'):
+            report(f'{client} {key}',
+                   min(result[key] for result in results))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,49 @@
+'''Benchmark bulk permission checks against a per-item loop.
+
+Usage:
+    python -m benchmarks.permissions [number of images]
+'''
+import sys
+from minerva_db.sql.api import Client
+from minerva_db.sql.models import (User, Group, Membership, Repository,
+                                   Grant, Image)
+from .common import scratch_session, timeit, report
+
+
+def seed(session, n):
+    user = User('bench-user')
+    group = Group('bench-group', 'bench-group')
+    repository = Repository('bench-repository', 'bench-repository')
+    session.add_all([
+        user, group, repository,
+        Membership(group, user, 'Member'),
+        Grant(group, repository, 'Read')
+    ])
+    session.add_all([
+        Image(f'bench-image-{i}', f'image{i}', 1, 'tiff', 'zlib', 1024,
+              repository)
+        for i in range(n)
+    ])
+    session.commit()
+    return [f'bench-image-{i}' for i in range(n)]
+
+
+def main(n=200):
+    with scratch_session() as session:
+        client = Client(session)
+        image_uuids = seed(session, n)
+        targets = [('Image', uuid, 'Read') for uuid in image_uuids]
+
+        def loop():
+            for target in targets:
+                client.has_permission('bench-user', *target)
+
+        def bulk():
+            client.has_permissions('bench-user', targets)
+
+        report(f'has_permission loop ({n} images)', timeit(loop), n)
+        report(f'has_permissions bulk ({n} images)', timeit(bulk), n)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
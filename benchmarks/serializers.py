@@ -0,0 +1,38 @@
+'''Benchmark the compiled serializers against the marshmallow schemas.
+
+Usage:
+    python -m benchmarks.serializers [numbers of keys]
+'''
+import sys
+from minerva_db.sql.models import Repository, Import, Key
+from minerva_db.sql.serializers import keys_schema
+from minerva_db.sql.serializers import compiled
+from .common import scratch_session, timeit, report
+
+
+def seed(session, n):
+    repository = Repository('bench-repository', 'bench-repository')
+    import_ = Import('bench-import', 'bench-import', repository)
+    session.add_all([repository, import_])
+    session.flush()
+    session.execute('''
+        INSERT INTO t_key (key, import_uuid)
+        SELECT 'bench-key-' || i, 'bench-import'
+        FROM generate_series(1, :n) AS i
+    ''', {'n': n})
+
+
+def main(*sizes):
+    for n in sizes or (10000, 1000000):
+        with scratch_session() as session:
+            seed(session, n)
+            keys = session.query(Key).all()
+            report(f'marshmallow keys_schema ({n} keys)',
+                   timeit(lambda: keys_schema.dump(keys), repeat=3), n)
+            report(f'compiled keys_schema ({n} keys)',
+                   timeit(lambda: compiled.keys_schema.dump(keys), repeat=3),
+                   n)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -43,6 +43,7 @@ setup(
     packages=find_packages('src'),
     include_package_data=True,
     install_requires=REQUIRES,
+    python_requires='>=3.7',
     setup_requires=['pytest-runner'],
     tests_require=TEST_REQUIRES,
     classifiers=[
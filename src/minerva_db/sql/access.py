@@ -0,0 +1,32 @@
+'''Permissions and repository access levels.
+
+This module is imported by the MiniClient so it must not import the models.
+'''
+from typing import List
+
+# Ordered from lowest to highest. The database enumeration is declared in the
+# same order so a permission compares greater than or equal to all of those
+# which it implies.
+permission_type = ('Read', 'Write', 'Admin')
+
+# The permission that everyone, including anonymous users, has on a
+# repository with each public access level
+public_permission = {
+    'PublicRead': 'Read',
+    'PublicWrite': 'Write'
+}
+
+
+def public_access(permission: str) -> List[str]:
+    '''Access levels which give everyone a permission.
+
+    Args:
+        permission: Sought permission.
+
+    Returns:
+        The access levels, empty if the permission is never public.
+    '''
+
+    rank = permission_type.index(permission)
+    return [access for access, public in public_permission.items()
+            if permission_type.index(public) >= rank]
@@ -1,3 +1,19 @@
-from .client import Client, DBError
+'''The Client is only imported when first accessed, as importing it imports
+all the models.
+'''
+from importlib import import_module
+
+
+def __getattr__(name):
+    if name not in __all__:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    value = getattr(import_module('.client', __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
+
 
 __all__ = ['Client', 'DBError']
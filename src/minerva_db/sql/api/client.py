@@ -1,15 +1,25 @@
-from minerva_db.sql.serializers import users_schema, grant_schema, groups_schema
+import time
+from contextlib import contextmanager
+from uuid import uuid4
+import psycopg2
+from psycopg2.errorcodes import FOREIGN_KEY_VIOLATION
+from psycopg2.extras import Json, execute_values
+from sqlalchemy import (String, Text, cast, func, literal_column, or_,
+                        select, tuple_)
+from sqlalchemy.dialects.postgresql import ARRAY, insert
+from sqlalchemy.exc import DBAPIError, IntegrityError
 from sqlalchemy.orm import Session, joinedload
-from typing import Dict, List, Optional, Union
+from sqlalchemy.orm.exc import NoResultFound
+from itertools import islice
+from typing import (Callable, Dict, Iterable, Iterator, List, Optional, Tuple,
+                    Union)
 from ..models import (User, Group, Membership, Repository, Import,
-                      Fileset, Image, Key, Grant, RenderingSettings, Subject)
-from ..serializers import (user_schema, group_schema, repository_schema,
-                           repositories_schema, import_schema, imports_schema,
-                           keys_schema, fileset_schema, filesets_schema,
-                           image_schema, images_schema, grants_schema,
-                           membership_schema, rendering_settings_schema)
+                      Fileset, Image, Key, Grant, RenderingSettings,
+                      EffectivePermission)
+from ..serializers import compiled
+from ..cache import PermissionCache
 from . import premade
-from .utils import to_jsonapi
+from .utils import to_jsonapi, encode_cursor, decode_cursor
 
 
 class DBError(Exception):
@@ -21,8 +31,11 @@ SDict = Dict[str, Union[str, float, int]]
 
 class Client:
 
-    def __init__(self, session: Session):
+    def __init__(self, session: Session,
+                 permission_cache: Optional[PermissionCache] = None):
         self.session: Session = session
+        self.permission_cache = permission_cache
+        self._batch_depth = 0
 
     def _session(self) -> Session:
         '''Get session.
@@ -33,6 +46,104 @@ class Client:
 
         return self.session
 
+    def _commit(self):
+        '''Commit the session, or only flush it within a batch.'''
+
+        if self._batch_depth > 0:
+            self.session.flush()
+        else:
+            self.session.commit()
+
+    def _rollback(self):
+        '''Roll back the session after an error, unless within a batch, which
+        rolls back as the error leaves it.'''
+
+        if self._batch_depth == 0:
+            self.session.rollback()
+
+    @contextmanager
+    def batch(self):
+        '''Context in which changes are committed together.
+
+        Changes made by the client within the context are only flushed, and
+        are committed in a single transaction when the outermost context
+        exits. If an error leaves a context, its changes are rolled back and
+        the error is raised. Nested contexts are savepoints, so an error
+        caught outside a nested context leaves the changes made before it
+        intact.
+
+        Yields:
+            The client.
+        '''
+
+        savepoint = None
+        if self._batch_depth > 0:
+            savepoint = self.session.begin_nested()
+
+        self._batch_depth += 1
+        try:
+            yield self
+        except BaseException:
+            self._batch_depth -= 1
+            if savepoint is not None:
+                savepoint.rollback()
+            else:
+                self.session.rollback()
+            raise
+
+        self._batch_depth -= 1
+        if savepoint is not None:
+            savepoint.commit()
+        else:
+            self.session.commit()
+
+    def _json_document(self, q) -> str:
+        '''Get a JSON:API document built in the database.
+
+        Args:
+            q: Select of a single row with the `data` and the `included`
+                resources of the document, by key.
+
+        Returns:
+            The document as text.
+
+        Raises:
+            NoResultFound: If there is no row.
+        '''
+
+        subquery = q.alias()
+        included = []
+        for column in subquery.columns:
+            if column.key != 'data':
+                included.extend([column.key, column])
+
+        document = func.json_build_object(
+            'data', subquery.c.data,
+            'included', func.json_build_object(*included)
+        )
+        text = self.session.execute(
+            select([cast(document, Text)]).select_from(subquery)
+        ).scalar()
+        if text is None:
+            raise NoResultFound('No row was found for one()')
+        return text
+
+    def _invalidate_permissions(self, user_uuid: Optional[str] = None):
+        '''Invalidate cached permission decisions, if there is a cache.
+
+        Args:
+            user_uuid: UUID of the user whose decisions have changed. Default:
+                `None` for everyone's.
+        '''
+
+        if self.permission_cache is None:
+            return
+
+        if user_uuid is None:
+            self.permission_cache.invalidate_all()
+        else:
+            self.permission_cache.invalidate_user(user_uuid)
+
     def create_group(self, uuid: str, name: str, user_uuid: str) -> SDict:
         '''Create a group with the specified user as a member.
 
@@ -50,8 +161,8 @@ class Client:
         membership = Membership(group, user, 'Owner')
         self.session.add(group)
         self.session.add(membership)
-        self.session.commit()
-        return to_jsonapi(group_schema.dump(group))
+        self._commit()
+        return to_jsonapi(compiled.group_schema.dump(group))
 
     def create_user(self, uuid: str, name: str=None) -> SDict:
         '''Create a user.
@@ -65,8 +176,8 @@ class Client:
 
         user = User(uuid, name)
         self.session.add(user)
-        self.session.commit()
-        return to_jsonapi(user_schema.dump(user))
+        self._commit()
+        return to_jsonapi(compiled.user_schema.dump(user))
 
     def create_membership(self, group_uuid: str, user_uuid: str,
                           membership_type: str) -> SDict:
@@ -95,8 +206,9 @@ class Client:
 
         membership = Membership(group, user, membership_type)
         self.session.add(membership)
-        self.session.commit()
-        return to_jsonapi(membership_schema.dump(membership))
+        self._commit()
+        self._invalidate_permissions(user_uuid)
+        return to_jsonapi(compiled.membership_schema.dump(membership))
 
     # Resources
     def create_repository(self, uuid: str, name: str, user_uuid: str,
@@ -118,8 +230,8 @@ class Client:
         repository = Repository(uuid, name, raw_storage)
         grant = Grant(user, repository, permission='Admin')
         self.session.add_all((repository, grant))
-        self.session.commit()
-        return to_jsonapi(repository_schema.dump(repository))
+        self._commit()
+        return to_jsonapi(compiled.repository_schema.dump(repository))
 
     def create_import(self, uuid: str, name: str,
                       repository_uuid: str) -> SDict:
@@ -140,15 +252,17 @@ class Client:
             .one()
         import_ = Import(uuid, name, repository)
         self.session.add(import_)
-        self.session.commit()
-        return to_jsonapi(import_schema.dump(import_))
+        self._commit()
+        return to_jsonapi(compiled.import_schema.dump(import_))
 
     def create_fileset(self, uuid: str, name: str, reader: str,
                        reader_software: str, reader_version: str,
-                       keys: List[str], import_uuid: str, progress=0) -> SDict:
+                       keys: List[str], import_uuid: str, progress=0,
+                       key_pattern: Optional[str] = None) -> SDict:
         '''Create a fileset within the specified import.
 
-        Associates the given files.
+        Associates the given files. They are assigned with a single
+        statement, without loading them.
 
         Args:
             uuid: UUID of the Fileset.
@@ -160,29 +274,52 @@ class Client:
                 the entrypoint.
             import_uuid: UUID of the import.
             progress: Progress of importing the fileset
+            key_pattern: SQL `LIKE` pattern of further keys to associate,
+                e.g. a prefix followed by `%`.
 
         Returns:
             The newly created Fileset.
+
+        Raises:
+            DBError: If a key is already used by another Fileset.
         '''
 
         import_ = self.session.query(Import) \
             .filter(Import.uuid == import_uuid) \
             .one()
+
+        criteria = [Key.key.in_(keys)]
+        if key_pattern is not None:
+            criteria.append(Key.key.like(key_pattern))
+        q_keys = self.session.query(Key) \
+            .filter(Key.import_uuid == import_uuid) \
+            .filter(or_(*criteria))
+
+        savepoint = self.session.begin_nested()
         fileset = Fileset(uuid, name, reader, reader_software, reader_version,
                           import_, progress)
-        s3_keys = self.session.query(Key) \
-            .filter(Key.import_uuid == import_uuid) \
-            .filter(Key.key.in_(keys)) \
-            .all()
-        for key in s3_keys:
-            if key.fileset is not None:
-                raise DBError('Key is already used by another Fileset:'
-                              f'{key.key}')
-            key.fileset = fileset
         self.session.add(fileset)
-        self.session.add_all(s3_keys)
-        self.session.commit()
-        return to_jsonapi(fileset_schema.dump(fileset))
+        self.session.flush()
+
+        assigned = q_keys \
+            .filter(Key.fileset_uuid.is_(None)) \
+            .update({Key.fileset_uuid: uuid}, synchronize_session=False)
+
+        # Fewer keys than were given or matched means some were either
+        # missing, which is ignored, or used by another fileset
+        if key_pattern is not None or assigned < len(set(keys)):
+            used = q_keys \
+                .filter(Key.fileset_uuid != uuid) \
+                .with_entities(Key.key) \
+                .first()
+            if used is not None:
+                savepoint.rollback()
+                raise DBError('Key is already used by another Fileset:'
+                              f'{used.key}')
+
+        savepoint.commit()
+        self._commit()
+        return to_jsonapi(compiled.fileset_schema.dump(fileset))
 
     def create_image(self, uuid: str, name: str, pyramid_levels: int,
                      format, compression, tile_size, rgb=False,
@@ -211,37 +348,230 @@ class Client:
 
         image = Image(uuid, name, pyramid_levels, format, compression, tile_size, repository, fileset, rgb)
         self.session.add(image)
-        self.session.commit()
-        return to_jsonapi(image_schema.dump(image))
+        self._commit()
+        return to_jsonapi(compiled.image_schema.dump(image))
 
     def create_rendering_settings(self, uuid:str, image_uuid: str, channels, label=None):
         image = self.session.query(Image).filter(Image.uuid == image_uuid).one()
         rendering_settings = RenderingSettings(uuid, image, channels, label)
         self.session.add(rendering_settings)
-        self.session.commit()
+        self._commit()
 
     def update_rendering_settings(self, uuid:str, channels, label=None):
         rendering_settings = self.session.query(RenderingSettings).filter(RenderingSettings.uuid == str(uuid)).one()
         rendering_settings.label = label
         rendering_settings.channels = channels
-        self.session.commit()
+        self._commit()
 
-    def add_keys_to_import(self, keys: List[str], import_uuid: str) -> SDict:
+    def add_keys_to_import(
+        self,
+        keys: Iterable[str],
+        import_uuid: str,
+        batch_size: int = 10000,
+        skip_existing: bool = False,
+        progress: Optional[Callable[[int, float], None]] = None
+    ) -> int:
         '''Create keys within the specified import.
 
+        The keys are inserted in batches, each with a single statement and
+        committed on its own unless within a `batch`, without creating any
+        objects. An interrupted
+        upload can be resumed by adding all its keys again with
+        `skip_existing`.
+
         Args:
-            keys: UUID keys of the files.
+            keys: UUID keys of the files. Any iterable, consumed a batch at a
+                time.
             import_uuid: UUID of the import.
+            batch_size: Number of keys inserted by each statement.
+                Default: 10000.
+            skip_existing: Skip keys which already exist in the import,
+                rather than failing. Default: `False`.
+            progress: Called after each batch with the number of keys
+                processed so far and the throughput of the batch in keys per
+                second.
+
+        Returns:
+            The number of keys created.
+
+        Raises:
+            NoResultFound: If there is no such import.
+            IntegrityError: If a key already exists and not `skip_existing`.
         '''
 
-        import_ = self.session.query(Import) \
+        if batch_size < 1:
+            raise ValueError(f'Specified batch size invalid: {batch_size}')
+
+        self.session.query(Import.uuid) \
             .filter(Import.uuid == import_uuid) \
             .one()
 
-        s3_keys = [Key(key, import_=import_) for key in keys]
+        sql = (f'INSERT INTO {Key.__table__.name} (key, import_uuid) '
+               'VALUES %s')
+        if skip_existing:
+            sql += ' ON CONFLICT DO NOTHING'
+
+        keys = iter(keys)
+        processed = 0
+        created = 0
+        while True:
+            batch = [(key, import_uuid) for key in islice(keys, batch_size)]
+            if len(batch) == 0:
+                return created
+
+            start = time.perf_counter()
+            created += self._execute_values(sql, batch)
+            self._commit()
+            seconds = time.perf_counter() - start
+
+            processed += len(batch)
+            if progress is not None:
+                progress(processed, len(batch) / seconds)
+
+    def _lock_repository_permissions(self, repository_uuids: Iterable[str]):
+        '''Lock the effective permissions of repositories, as the triggers on
+        Grant do, until the end of the transaction.
+
+        A statement which both inserts and updates grants fires both the
+        insert and the update trigger, each locking only its own
+        repositories. Locking them all first keeps the order of the locks.
+
+        Args:
+            repository_uuids: UUIDs of the repositories.
+        '''
+
+        self.session.execute(select([func.f_lock_effective_permission(
+            'repository',
+            cast(sorted(set(repository_uuids)), ARRAY(String))
+        )]))
+
+    def _execute_values(self, sql: str, rows: List[Tuple], fetch=False):
+        '''Execute a statement for many rows at once on the session's
+        connection.
+
+        Rows are passed straight to psycopg2, which is much faster than
+        having SQLAlchemy compile a parameter for each value.
+
+        Args:
+            sql: Statement with a single `VALUES %s`.
+            rows: Tuples of the values of each row.
+            fetch: Fetch the rows returned by the statement.
+
+        Returns:
+            The number of rows affected, or the returned rows if `fetch`.
+
+        Raises:
+            DBAPIError: The SQLAlchemy exception for any database error.
+        '''
+
+        try:
+            with self.session.connection().connection.cursor() as cursor:
+                result = execute_values(cursor, sql, rows,
+                                        page_size=len(rows), fetch=fetch)
+                return result if fetch else cursor.rowcount
+        except psycopg2.Error as e:
+            self._rollback()
+            raise DBAPIError.instance(sql, None, e, psycopg2.Error)
+
+    def _insert_images(self, fileset_uuid: str, repository_uuid: str,
+                       images: List[SDict],
+                       rendering_settings: Optional[SDict] = None
+                       ) -> List[str]:
+        '''Insert images into a fileset with a single statement.
+
+        Args:
+            fileset_uuid: UUID of the Fileset.
+            repository_uuid: UUID of the Fileset's Repository.
+            images: Details of each image, as the arguments of `Image`.
+            rendering_settings: Rendering settings to create for each image.
+
+        Returns:
+            The UUIDs of the images.
+        '''
+
+        if len(images) == 0:
+            return []
+
+        columns = ('uuid', 'name', 'pyramid_levels', 'tile_size', 'format',
+                   'compression', 'rgb', 'pixel_type')
+        defaults = {
+            'format': None,
+            'compression': None,
+            'rgb': False,
+            'pixel_type': 'uint16'
+        }
+        for image in images:
+            invalid = (set(image) - set(columns)) | (
+                set(columns) - set(defaults) - set(image)
+            )
+            if len(invalid) > 0:
+                raise ValueError(f'Specified image details invalid: '
+                                 f'{", ".join(sorted(invalid))}')
+
+        rows = [
+            tuple({**defaults, **image}[column] for column in columns)
+            + (False, fileset_uuid, repository_uuid)
+            for image in images
+        ]
+        image_uuids = [image_uuid for image_uuid, in self._execute_values(
+            f'INSERT INTO {Image.__table__.name} '
+            f'({", ".join(columns)}, deleted, fileset_uuid, repository_uuid) '
+            'VALUES %s RETURNING uuid',
+            rows, fetch=True
+        )]
+
+        if rendering_settings is not None:
+            channels = Json(rendering_settings['channels'])
+            label = rendering_settings.get('label')
+            self._execute_values(
+                f'INSERT INTO {RenderingSettings.__table__.name} '
+                '(uuid, image_uuid, label, channels) VALUES %s',
+                [(str(uuid4()), image_uuid, label, channels)
+                 for image_uuid in image_uuids]
+            )
+
+        return image_uuids
+
+    def add_images_to_fileset(self, uuid: str, images: List[SDict],
+                              rendering_settings: Optional[SDict] = None
+                              ) -> List[str]:
+        '''Register images to a completed Fileset.
+
+        The images are inserted with a single statement, without creating
+        any objects, so this suits filesets with many images.
+
+        Args:
+            uuid: UUID of the Fileset.
+            images: Details of each image: `uuid`, `name`, `pyramid_levels`,
+                `tile_size` and optionally `format`, `compression`, `rgb` and
+                `pixel_type`.
+            rendering_settings: Default rendering settings to create for each
+                image, with `channels` and optionally a `label`. Default:
+                `None` for none.
+
+        Returns:
+            The UUIDs of the new images.
+
+        Raises:
+            NoResultFound: If there is no such Fileset.
+            DBError: If the Fileset is not complete.
+        '''
+
+        complete, repository_uuid = (
+            self.session.query(Fileset.complete, Import.repository_uuid)
+            .join(Fileset.import_)
+            .filter(Fileset.uuid == uuid)
+            .one()
+        )
+
+        if complete is False:
+            raise DBError('Images can only be registered to a completed '
+                          'Fileset.')
 
-        self.session.add_all(s3_keys)
-        self.session.commit()
+        image_uuids = self._insert_images(uuid, repository_uuid, images,
+                                          rendering_settings)
+        self._commit()
+        return image_uuids
 
     def grant_repository_to_subject(self, repository_uuid, subject_uuid,
                                     permission: str) -> SDict:
@@ -256,36 +586,123 @@ class Client:
             The grant that was created or updated.
         '''
 
-        # TODO Get from enumeration in model or potentially catch
-        # psycopg2.DataError and rely on database to check
         permission = permission.capitalize()
-        if permission not in ['Read', 'Write', 'Admin']:
+        if permission not in Grant.permission_type:
             raise ValueError(f'Specified permission invalid: {permission}')
 
-        grant = self.session.query(Grant) \
-            .filter(Grant.repository_uuid == repository_uuid) \
-            .filter(Grant.subject_uuid == subject_uuid) \
-            .one_or_none()
+        # Created or updated with a single statement, so concurrent grants
+        # of the same pair cannot conflict
+        grants = Grant.__table__
+        statement = insert(grants).values(subject_uuid=subject_uuid,
+                                          repository_uuid=repository_uuid,
+                                          permission=permission)
+        statement = statement.on_conflict_do_update(
+            index_elements=[grants.c.subject_uuid, grants.c.repository_uuid],
+            set_={'permission': statement.excluded.permission}
+        ).returning(*grants.columns)
+
+        try:
+            result = self.session.execute(statement)
+        except IntegrityError as e:
+            self._rollback()
+            # The repository or subject does not exist
+            if e.orig.pgcode == FOREIGN_KEY_VIOLATION:
+                raise NoResultFound('No row was found for one()') from e
+            raise
+
+        # Loaded so any copy of the grant in the session is refreshed, and
+        # serialized before the commit expires it, which would reload it
+        grant, = self.session.query(Grant).populate_existing().instances(
+            result
+        )
+        d = compiled.grant_schema.dump(grant)
+        self._commit()
+        # The subject may be a group, so any user could be affected
+        self._invalidate_permissions()
+        return to_jsonapi(d)
 
-        # No existing grant exists
-        if grant is None:
-            repository = self.session.query(Repository) \
-                .filter(Repository.uuid == repository_uuid) \
-                .one()
+    def grant_repositories_to_subjects(
+        self,
+        pairs: Iterable[Tuple[str, str]],
+        permission: str
+    ) -> Dict[str, List[Tuple[str, str]]]:
+        '''Grant many repositories to many subjects at once.
 
-            subject = self.session.query(Subject) \
-                .filter(Subject.uuid == subject_uuid) \
-                .one()
+        The effective permissions of the repositories are locked, and then
+        all the grants are created or updated with a single statement. They
+        are written in the order of their repository and then subject, the
+        same order as revoke_grants, so that concurrent grants and revokes
+        lock rows in the same order.
 
-            grant = Grant(subject, repository, permission)
-            self.session.add(grant)
+        Args:
+            pairs: Tuples of the UUID of a repository and the UUID of the
+                subject to grant it to.
+            permission: Permission to grant.
 
-        # Grant exists, so potentially update permission
-        else:
-            grant.permission = permission
+        Returns:
+            The pairs which were `created`, `updated` to the permission, or
+            already had it and are `unchanged`.
+
+        Raises:
+            NoResultFound: If a repository or subject does not exist.
+        '''
 
-        self.session.commit()
-        return to_jsonapi(grant_schema.dump(grant))
+        permission = permission.capitalize()
+        if permission not in Grant.permission_type:
+            raise ValueError(f'Specified permission invalid: {permission}')
+
+        pairs = sorted(set(pairs))
+        result = {'created': [], 'updated': [], 'unchanged': []}
+        if len(pairs) == 0:
+            return result
+
+        self._lock_repository_permissions(
+            repository_uuid for repository_uuid, _ in pairs
+        )
+        grants = Grant.__table__
+        statement = insert(grants).values([
+            {
+                'subject_uuid': subject_uuid,
+                'repository_uuid': repository_uuid,
+                'permission': permission
+            }
+            for repository_uuid, subject_uuid in pairs
+        ])
+        # Rows are only returned if written, and those inserted rather than
+        # updated have not been deleted by any transaction
+        statement = statement.on_conflict_do_update(
+            index_elements=[grants.c.subject_uuid, grants.c.repository_uuid],
+            set_={'permission': statement.excluded.permission},
+            where=grants.c.permission != statement.excluded.permission
+        ).returning(grants.c.repository_uuid, grants.c.subject_uuid,
+                    literal_column(f'{grants.name}.xmax') == 0)
+
+        try:
+            written = {
+                (repository_uuid, subject_uuid): created
+                for repository_uuid, subject_uuid, created
+                in self.session.execute(statement)
+            }
+        except IntegrityError as e:
+            self._rollback()
+            # A repository or subject does not exist
+            if e.orig.pgcode == FOREIGN_KEY_VIOLATION:
+                raise NoResultFound('No row was found for one()') from e
+            raise
+
+        self._commit()
+        # The subjects may be groups, so any user could be affected
+        self._invalidate_permissions()
+
+        for pair in pairs:
+            created = written.get(pair)
+            if created is None:
+                result['unchanged'].append(pair)
+            elif created:
+                result['created'].append(pair)
+            else:
+                result['updated'].append(pair)
+        return result
 
     def get_fileset(self, uuid: str) -> SDict:
         '''Get details of the specified Fileset.
@@ -297,7 +714,7 @@ class Client:
             The Fileset details.
         '''
 
-        return to_jsonapi(fileset_schema.dump(
+        return to_jsonapi(compiled.fileset_schema.dump(
             self.session.query(Fileset)
             .filter(Fileset.uuid == uuid)
             .one()
@@ -313,28 +730,48 @@ class Client:
             The group details.
         '''
 
-        return to_jsonapi(group_schema.dump(
+        return to_jsonapi(compiled.group_schema.dump(
             self.session.query(Group)
             .filter(Group.uuid == uuid)
             .one()
         ))
 
-    def get_image(self, uuid: str) -> SDict:
+    def get_image(self, uuid: str, as_json: bool = False) -> SDict:
         '''Get details of the specified image.
 
         Args:
             uuid: UUID of the image.
+            as_json: Build the document in the database and return it as
+                JSON text. Default: `False`.
 
         Returns:
             The image details.
         '''
+
+        if as_json:
+            rendering_settings = (
+                select([compiled.rendering_settings_schema.json_array()])
+                .where(RenderingSettings.image_uuid == Image.uuid)
+                .as_scalar()
+            )
+            return self._json_document(
+                select([
+                    compiled.image_schema.json_object().label('data'),
+                    rendering_settings.label('rendering_settings')
+                ])
+                .where(Image.uuid == uuid)
+            )
+
         image = self.session.query(Image).outerjoin(Image.rendering_settings) \
                 .filter(Image.uuid == uuid) \
                 .one()
 
-        return to_jsonapi(image_schema.dump(image),
+        return to_jsonapi(compiled.image_schema.dump(image),
             {
-                'rendering_settings': rendering_settings_schema.dump(image.rendering_settings)
+                'rendering_settings':
+                    compiled.rendering_settings_schema.dump(
+                        image.rendering_settings
+                    )
             }
         )
 
@@ -356,7 +793,7 @@ class Client:
             ValueError: If there is not exactly one matching import.
         '''
 
-        return to_jsonapi(import_schema.dump(
+        return to_jsonapi(compiled.import_schema.dump(
             self.session.query(Import)
             .filter(Import.uuid == uuid)
             .one()
@@ -372,7 +809,7 @@ class Client:
             The repository details.
         '''
 
-        return to_jsonapi(repository_schema.dump(
+        return to_jsonapi(compiled.repository_schema.dump(
             self.session.query(Repository)
             .filter(Repository.uuid == uuid)
             .one()
@@ -391,7 +828,7 @@ class Client:
             ValueError: If there is not exactly one matching user.
         '''
 
-        return to_jsonapi(user_schema.dump(
+        return to_jsonapi(compiled.user_schema.dump(
             self.session.query(User)
             .filter(User.uuid == uuid)
             .one()
@@ -399,7 +836,7 @@ class Client:
 
     def find_user(self, search: str):
         like_parameter = '%' + search + '%'
-        return to_jsonapi(users_schema.dump(
+        return to_jsonapi(compiled.users_schema.dump(
             self.session.query(User)
                 .filter(User.name.ilike(like_parameter))
                 .all()
@@ -407,18 +844,21 @@ class Client:
 
     def find_group(self, search: str):
         like_parameter = '%' + search + '%'
-        return to_jsonapi(groups_schema.dump(
+        return to_jsonapi(compiled.groups_schema.dump(
             self.session.query(Group)
                 .filter(Group.name.ilike(like_parameter))
                 .all()
         ))
 
-    def get_membership(self, group_uuid: str, user_uuid: str) -> SDict:
+    def get_membership(self, group_uuid: str, user_uuid: str,
+                       as_json: bool = False) -> SDict:
         '''Get details of the membership.
 
         Args:
             group_uuid: UUID of the group.
             user_uuid: UUID of the user.
+            as_json: Build the document in the database and return it as
+                JSON text. Default: `False`.
 
         Returns:
             The membership details.
@@ -427,6 +867,28 @@ class Client:
             ValueError: If there is not exactly one matching membership.
         '''
 
+        if as_json:
+            return self._json_document(
+                select([
+                    compiled.membership_schema.json_object().label('data'),
+                    func.json_build_array(
+                        compiled.group_schema.json_object()
+                    ).label('groups'),
+                    func.json_build_array(
+                        compiled.user_schema.json_object()
+                    ).label('users')
+                ])
+                .select_from(
+                    Membership.__table__
+                    .join(Group.__table__,
+                          Group.__table__.c.uuid == Membership.group_uuid)
+                    .join(User.__table__,
+                          User.__table__.c.uuid == Membership.user_uuid)
+                )
+                .where(Membership.group_uuid == group_uuid)
+                .where(Membership.user_uuid == user_uuid)
+            )
+
         membership = (
             self.session.query(Membership)
             .filter(Membership.group_uuid == group_uuid)
@@ -439,10 +901,10 @@ class Client:
         )
 
         return to_jsonapi(
-            membership_schema.dump(membership),
+            compiled.membership_schema.dump(membership),
             {
-                'groups': [group_schema.dump(membership.group)],
-                'users': [user_schema.dump(membership.user)]
+                'groups': [compiled.group_schema.dump(membership.group)],
+                'users': [compiled.user_schema.dump(membership.user)]
             }
         )
 
@@ -460,17 +922,16 @@ class Client:
             implied by a level of membership that the member does have) or not.
         '''
 
-        # TODO Calculate this centrally driven from the model
-        # Calculate the memberships which imply the requested one
-        implied = [membership_type]
-        if membership_type == 'Member':
-            implied.append('Owner')
+        if membership_type not in Membership.membership_type_type:
+            raise ValueError(f'Specified membership type invalid: '
+                             f'{membership_type}')
 
+        # Higher membership types imply the lower ones
         q = (
             self.session.query(Membership)
             .filter(Membership.group_uuid == group_uuid)
             .filter(Membership.user_uuid == user_uuid)
-            .filter(Membership.membership_type.in_(implied))
+            .filter(Membership.membership_type >= membership_type)
             .exists()
         )
 
@@ -489,73 +950,213 @@ class Client:
 
         return self.is_member(group_uuid, user_uuid, 'Owner')
 
-    def has_permission(self, user_uuid: str, resource_type: str,
+    def has_permission(self, user_uuid: Optional[str], resource_type: str,
                        resource_uuid: str,
                        permission: Optional[str] = 'Read') -> bool:
         '''Determine if a user has a required permission on a given resource.
 
         Args:
-            user_uuid: UUID of the user.
+            user_uuid: UUID of the user, `None` for an anonymous user.
             resource_type: Type of the resource.
             resource_uuid: UUID of the resource.
             permission: Sought permission. Defaults to 'Read'
 
         Returns:
-            If user has permission or not.
+            If user has permission or not. Everyone has the permissions
+            given by a public repository.
         '''
 
-        # TODO Calculate this centrally driven from the model
-        # Caclculate the permissions which imply the requested one
-        implied = [permission]
-        if permission == 'Read':
-            implied.extend(['Write', 'Admin'])
-        if permission == 'Write':
-            implied.append('Admin')
+        q, column = premade.q_public(self.session, resource_type, permission)
+        # Only existance of results required
+        exists = [q.filter(column == resource_uuid).exists()]
 
-        # Calculate subjects that the user is a member of that might have the
-        # required permission granted
-        q_subject_uuids = premade.q_subject_uuids(self.session, user_uuid)
+        if user_uuid is not None:
+            q, column = premade.q_granted(self.session, user_uuid,
+                                          resource_type, permission)
+            exists.append(q.filter(column == resource_uuid).exists())
 
-        # Base query
-        q = (
-            self.session.query(Grant)
-            .filter(Grant.permission.in_(implied))
-            .filter(Grant.subject_uuid.in_(q_subject_uuids))
+        return self.session.query(or_(*exists)).scalar()
+
+    def has_permissions(self, user_uuid: Optional[str],
+                        targets: List[Tuple[str, str, str]]
+                        ) -> Dict[Tuple[str, str, str], bool]:
+        '''Determine if a user has the required permissions on many resources.
+
+        All the targets are authorized with a single statement.
+
+        Args:
+            user_uuid: UUID of the user, `None` for an anonymous user.
+            targets: Tuples of resource type, resource UUID and sought
+                permission. The resource types may be mixed.
+
+        Returns:
+            Mapping of each target to if user has permission or not.
+        '''
+
+        targets = [tuple(target) for target in targets]
+        if len(targets) == 0:
+            return {}
+
+        q = premade.q_permitted_resources(self.session, user_uuid, targets)
+        permitted = {tuple(row) for row in q.all()}
+
+        return {target: target in permitted for target in targets}
+
+    def rebuild_effective_permissions(self):
+        '''Recalculate the effective permissions of every user.
+
+        These are maintained by the database as grants and memberships
+        change, so this is only required to repair them.
+        '''
+
+        self.session.execute(
+            func.f_refresh_effective_permission(None, None).select()
         )
+        self._commit()
 
-        if resource_type == 'Repository':
-            q = q.filter(Grant.repository_uuid == resource_uuid)
+    def check_effective_permissions(self) -> Dict[str, List[SDict]]:
+        '''Compare the effective permissions with those calculated from the
+        grants and memberships.
 
-        elif resource_type == 'Import':
-            q = (
-                q.join(Grant.repository)
-                .join(Repository.imports)
-                .filter(Import.uuid == resource_uuid)
-            )
-        elif resource_type == 'Fileset':
-            q = (
-                q.join(Grant.repository)
-                .join(Repository.imports)
-                .join(Import.filesets)
-                .filter(Fileset.uuid == resource_uuid)
-            )
-        elif resource_type == 'Image':
-            q = (
-                q.join(Grant.repository)
-                .join(Repository.images)
-                .filter(Image.uuid == resource_uuid)
+        Returns:
+            The effective permissions which are missing (or have the wrong
+            permission) and those which are unexpected. Both are empty if
+            they are consistent.
+        '''
+
+        expected = {
+            tuple(row) for row in premade.q_effective_permissions(self.session)
+        }
+
+        actual = {
+            tuple(row) for row in self.session.query(
+                EffectivePermission.user_uuid,
+                EffectivePermission.repository_uuid,
+                EffectivePermission.permission
             )
+        }
 
-        # Only existance of results required
-        q = q.exists()
+        def as_dicts(rows):
+            return [
+                {
+                    'user_uuid': user_uuid,
+                    'repository_uuid': repository_uuid,
+                    'permission': permission
+                }
+                for user_uuid, repository_uuid, permission in sorted(rows)
+            ]
 
-        return self.session.query(q).scalar()
+        return {
+            'missing': as_dicts(expected - actual),
+            'unexpected': as_dicts(actual - expected)
+        }
+
+    def _list(self, schema, *criteria) -> List[SDict]:
+        '''Serialize the rows matching some criteria, selecting only the
+        serialized columns.
+
+        No objects are loaded, so nothing is added to the session.
+
+        Args:
+            schema: Compiled serializer of the model.
+            criteria: Criteria for the rows.
+
+        Returns:
+            The serialized rows.
+        '''
+
+        q = self.session.query(*schema.columns()).filter(*criteria)
+        return schema.dump_rows(q)
+
+    def _iter(self, schema, criteria,
+              chunk_size: int) -> Iterator[List[SDict]]:
+        '''Serialize the rows matching some criteria in chunks.
+
+        The rows are read through a server side cursor, so only a chunk at a
+        time is held in memory.
+
+        Args:
+            schema: Compiled serializer of the model.
+            criteria: Criteria for the rows.
+            chunk_size: Number of rows in each chunk.
+
+        Returns:
+            Generator of lists of serialized rows, all but the last of which
+            have `chunk_size` rows.
+        '''
+
+        # Validated here, rather than when iteration starts
+        if chunk_size < 1:
+            raise ValueError(f'Specified chunk size invalid: {chunk_size}')
+
+        q = (
+            self.session.query(*schema.columns())
+                .filter(*criteria)
+                .yield_per(chunk_size)
+        )
+
+        def chunks():
+            rows = iter(q)
+            while True:
+                chunk = list(islice(rows, chunk_size))
+                if len(chunk) == 0:
+                    return
+                yield schema.dump_rows(chunk)
+
+        return chunks()
+
+    def _list_page(self, schema, order, criteria, limit: Optional[int],
+                   cursor: Optional[str]) -> SDict:
+        '''Serialize a page of the rows matching some criteria.
+
+        Rows are paged by their position in the given order, which must be
+        unique, so that each page is a range scan of an index on the order
+        instead of skipping the preceding pages.
+
+        Args:
+            schema: Compiled serializer of the model.
+            order: Columns which the rows are ordered by.
+            criteria: Criteria for the rows.
+            limit: Maximum number of rows in a page. Default: `None` for all
+                rows.
+            cursor: Cursor of the page from the previous page's next link.
+                Default: `None` for the first page.
+
+        Returns:
+            The serialized page, with a link to the next page that is `None`
+            on the last page.
+        '''
+
+        if limit is None:
+            if cursor is not None:
+                raise ValueError('A cursor requires a limit')
+            return to_jsonapi(self._list(schema, *criteria))
+
+        if limit < 1:
+            raise ValueError(f'Specified limit invalid: {limit}')
+
+        q = self.session.query(*schema.columns()).filter(*criteria)
+        if cursor is not None:
+            values = decode_cursor(cursor, len(order))
+            q = q.filter(tuple_(*order) > tuple_(*values))
+
+        # Fetch one more row than needed to know if this is the last page
+        data = schema.dump_rows(q.order_by(*order).limit(limit + 1))
+
+        next_cursor = None
+        if len(data) > limit:
+            data = data[:limit]
+            next_cursor = encode_cursor([data[-1][column.key]
+                                         for column in order])
+
+        return to_jsonapi(data, links={'next': next_cursor})
 
     # TODO Should be list grants?
     def list_repositories_for_user(
         self,
         uuid: str,
-        implied: Optional[bool] = False
+        implied: Optional[bool] = False,
+        as_json: bool = False
     ) -> List[SDict]:
         '''List repositories that a user is a member of (with permissions).
 
@@ -563,6 +1164,8 @@ class Client:
             uuid: UUID of the user.
             implied: Include repositories implied through group membership.
                 Default: False.
+            as_json: Build the document in the database and return it as
+                JSON text. Default: `False`.
 
         Returns:
             The list of repositories the user is a member of along with the
@@ -570,6 +1173,23 @@ class Client:
         '''
 
         q_subject_uuids = premade.q_subject_uuids(self.session, uuid)
+
+        if as_json:
+            return self._json_document(
+                select([
+                    compiled.grants_schema.json_array().label('data'),
+                    compiled.repositories_schema.json_array()
+                    .label('repositories')
+                ])
+                .select_from(
+                    Grant.__table__.join(
+                        Repository.__table__,
+                        Repository.uuid == Grant.repository_uuid
+                    )
+                )
+                .where(Grant.subject_uuid.in_(q_subject_uuids))
+            )
+
         q = (
             self.session.query(Grant)
             .join(Grant.repository)
@@ -579,13 +1199,46 @@ class Client:
         repositories = [grant.repository for grant in grants]
 
         return to_jsonapi(
-            grants_schema.dump(grants),
+            compiled.grants_schema.dump(grants),
             {
-                'repositories': repositories_schema.dump(repositories)
+                'repositories':
+                    compiled.repositories_schema.dump(repositories)
             }
         )
 
-    def list_grants_for_repository(self, uuid: str):
+    def list_grants_for_repository(self, uuid: str, as_json: bool = False):
+        '''List grants on a repository.
+
+        Args:
+            uuid: UUID of the repository.
+            as_json: Build the document in the database and return it as
+                JSON text. Default: `False`.
+
+        Returns:
+            The grants along with the users and groups they are to.
+        '''
+
+        if as_json:
+            q_subject_uuids = (
+                select([Grant.subject_uuid])
+                .where(Grant.repository_uuid == uuid)
+            )
+            users = User.__table__
+            groups = Group.__table__
+            return self._json_document(
+                select([
+                    select([compiled.grants_schema.json_array()])
+                    .where(Grant.repository_uuid == uuid)
+                    .as_scalar().label('data'),
+                    select([compiled.users_schema.json_array()])
+                    .where(users.c.uuid.in_(q_subject_uuids))
+                    .as_scalar().label('users'),
+                    select([compiled.groups_schema.json_array()])
+                    .where(groups.c.uuid.in_(q_subject_uuids))
+                    .as_scalar().label('groups')
+                ])
+            )
+
         q = (
             self.session.query(Grant)
                 .join(Grant.repository)
@@ -607,10 +1260,10 @@ class Client:
         groups = q.all()
 
         return to_jsonapi(
-            grants_schema.dump(grants),
+            compiled.grants_schema.dump(grants),
             {
-                'users': users_schema.dump(users),
-                'groups': groups_schema.dump(groups)
+                'users': compiled.users_schema.dump(users),
+                'groups': compiled.groups_schema.dump(groups)
             }
         )
 
@@ -624,12 +1277,32 @@ class Client:
             The list of imports in the repository.
         '''
 
-        return to_jsonapi(imports_schema.dump(
-            self.session.query(Import)
-            .filter(Import.repository_uuid == uuid)
-            .all()
+        return to_jsonapi(self._list(
+            compiled.imports_schema,
+            Import.repository_uuid == uuid
         ))
 
+    def iter_imports_in_repository(
+        self,
+        uuid: str,
+        chunk_size: int = 1000
+    ) -> Iterator[List[SDict]]:
+        '''Iterate over imports in given repository in chunks.
+
+        Args:
+            uuid: UUID of the repository.
+            chunk_size: Number of imports in each chunk. Default: 1000.
+
+        Yields:
+            Lists of imports in the repository.
+        '''
+
+        return self._iter(
+            compiled.imports_schema,
+            [Import.repository_uuid == uuid],
+            chunk_size
+        )
+
     def list_filesets_in_import(self, uuid: str) -> List[SDict]:
         '''List Filesets in given import.
 
@@ -640,27 +1313,76 @@ class Client:
             The list of Filesets in the import.
         '''
 
-        return to_jsonapi(filesets_schema.dump(
-            self.session.query(Fileset)
-            .filter(Fileset.import_uuid == uuid)
-            .all()
+        return to_jsonapi(self._list(
+            compiled.filesets_schema,
+            Fileset.import_uuid == uuid
         ))
 
-    def list_keys_in_import(self, uuid: str) -> List[SDict]:
+    def iter_filesets_in_import(
+        self,
+        uuid: str,
+        chunk_size: int = 1000
+    ) -> Iterator[List[SDict]]:
+        '''Iterate over Filesets in given import in chunks.
+
+        Args:
+            uuid: UUID of the import.
+            chunk_size: Number of Filesets in each chunk. Default: 1000.
+
+        Yields:
+            Lists of Filesets in the import.
+        '''
+
+        return self._iter(
+            compiled.filesets_schema,
+            [Fileset.import_uuid == uuid],
+            chunk_size
+        )
+
+    def list_keys_in_import(self, uuid: str, limit: Optional[int] = None,
+                            cursor: Optional[str] = None) -> List[SDict]:
         '''List keys in given import.
 
         Args:
             uuid: UUID of the import.
+            limit: Maximum number of keys to list. Default: `None` for all
+                keys.
+            cursor: Cursor to continue listing from, given in the `next`
+                link of the previous page. Default: `None` for the first page.
 
         Returns:
-            The list of keys in the import.
+            The list of keys in the import. If a limit is given, they are
+            ordered and have a link to the next page.
         '''
 
-        return to_jsonapi(keys_schema.dump(
-            self.session.query(Key)
-            .filter(Key.import_uuid == uuid)
-            .all()
-        ))
+        return self._list_page(
+            compiled.keys_schema,
+            [Key.import_uuid, Key.key],
+            [Key.import_uuid == uuid],
+            limit,
+            cursor
+        )
+
+    def iter_keys_in_import(
+        self,
+        uuid: str,
+        chunk_size: int = 1000
+    ) -> Iterator[List[SDict]]:
+        '''Iterate over keys in given import in chunks.
+
+        Args:
+            uuid: UUID of the import.
+            chunk_size: Number of keys in each chunk. Default: 1000.
+
+        Yields:
+            Lists of keys in the import.
+        '''
+
+        return self._iter(
+            compiled.keys_schema,
+            [Key.import_uuid == uuid],
+            chunk_size
+        )
 
     def list_images_in_fileset(self, uuid: str) -> List[SDict]:
         '''List images in given Fileset.
@@ -672,34 +1394,103 @@ class Client:
             The list of images in the Fileset.
         '''
 
-        return to_jsonapi(images_schema.dump(
-            self.session.query(Image)
-            .filter(Image.fileset_uuid == uuid)
-            .all()
+        return to_jsonapi(self._list(
+            compiled.images_schema,
+            Image.fileset_uuid == uuid
         ))
 
+    def iter_images_in_fileset(
+        self,
+        uuid: str,
+        chunk_size: int = 1000
+    ) -> Iterator[List[SDict]]:
+        '''Iterate over images in given Fileset in chunks.
+
+        Args:
+            uuid: UUID of the Fileset.
+            chunk_size: Number of images in each chunk. Default: 1000.
+
+        Yields:
+            Lists of images in the Fileset.
+        '''
+
+        return self._iter(
+            compiled.images_schema,
+            [Image.fileset_uuid == uuid],
+            chunk_size
+        )
+
     def list_images_in_repository(self, repository_uuid: str) -> List[SDict]:
-        return to_jsonapi(images_schema.dump(
-            self.session.query(Image)
-            .filter(Image.repository_uuid == repository_uuid)
-            .all()
+        return to_jsonapi(self._list(
+            compiled.images_schema,
+            Image.repository_uuid == repository_uuid
         ))
 
-    def list_keys_in_fileset(self, uuid: str) -> List[SDict]:
+    def iter_images_in_repository(
+        self,
+        repository_uuid: str,
+        chunk_size: int = 1000
+    ) -> Iterator[List[SDict]]:
+        '''Iterate over images in given repository in chunks.
+
+        Args:
+            repository_uuid: UUID of the repository.
+            chunk_size: Number of images in each chunk. Default: 1000.
+
+        Yields:
+            Lists of images in the repository.
+        '''
+
+        return self._iter(
+            compiled.images_schema,
+            [Image.repository_uuid == repository_uuid],
+            chunk_size
+        )
+
+    def list_keys_in_fileset(self, uuid: str, limit: Optional[int] = None,
+                             cursor: Optional[str] = None) -> List[SDict]:
         '''List keys in given Fileset.
 
         Args:
             uuid: UUID of the Fileset.
+            limit: Maximum number of keys to list. Default: `None` for all
+                keys.
+            cursor: Cursor to continue listing from, given in the `next`
+                link of the previous page. Default: `None` for the first page.
 
         Returns:
-            The list of keys in the Fileset.
+            The list of keys in the Fileset. If a limit is given, they are
+            ordered and have a link to the next page.
         '''
 
-        return to_jsonapi(keys_schema.dump(
-            self.session.query(Key)
-            .filter(Key.fileset_uuid == uuid)
-            .all()
-        ))
+        return self._list_page(
+            compiled.keys_schema,
+            [Key.import_uuid, Key.key],
+            [Key.fileset_uuid == uuid],
+            limit,
+            cursor
+        )
+
+    def iter_keys_in_fileset(
+        self,
+        uuid: str,
+        chunk_size: int = 1000
+    ) -> Iterator[List[SDict]]:
+        '''Iterate over keys in given Fileset in chunks.
+
+        Args:
+            uuid: UUID of the Fileset.
+            chunk_size: Number of keys in each chunk. Default: 1000.
+
+        Yields:
+            Lists of keys in the Fileset.
+        '''
+
+        return self._iter(
+            compiled.keys_schema,
+            [Key.fileset_uuid == uuid],
+            chunk_size
+        )
 
     def list_incomplete_imports(self) -> List[SDict]:
 
@@ -717,9 +1508,9 @@ class Client:
                     filesets.append(entity)
 
         return to_jsonapi(
-            grants_schema.dump(imports),
+            compiled.imports_schema.dump(imports),
             {
-                'filesets': filesets_schema.dump(filesets)
+                'filesets': compiled.filesets_schema.dump(filesets)
             }
         )
 
@@ -760,13 +1551,13 @@ class Client:
             import_.complete = complete
 
         self.session.add(import_)
-        self.session.commit()
-        return to_jsonapi(import_schema.dump(import_))
+        self._commit()
+        return to_jsonapi(compiled.import_schema.dump(import_))
 
     def update_fileset(self, uuid: str, name: Optional[str] = None,
                        complete: Optional[bool] = None,
                        images: Optional[List[SDict]] = None,
-                       progress: Optional[int] = 0) -> SDict:
+                       progress: Optional[int] = None) -> SDict:
         '''Update a Fileset.
 
         Args:
@@ -775,7 +1566,8 @@ class Client:
             complete: Updated completedness of the Fileset. Default: `None`
                 for no update.
             images: Updated list of images to register to the Fileset.
-            progress: Progress of the fileset import (0-100)
+            progress: Progress of the fileset import (0-100). Default: `None`
+                for no update.
 
         Returns:
             The updated Fileset.
@@ -801,12 +1593,37 @@ class Client:
                 raise DBError('Images can only be registered to a completed '
                               'Fileset.')
 
-            images = [Image(**image, fileset=fileset, repository=fileset.import_.repository) for image in images]
-            self.session.add_all(images)
+            self.session.flush()
+            self._insert_images(uuid, fileset.import_.repository_uuid, images)
 
         self.session.add(fileset)
-        self.session.commit()
-        return to_jsonapi(fileset_schema.dump(fileset))
+        self._commit()
+        return to_jsonapi(compiled.fileset_schema.dump(fileset))
+
+    def set_fileset_progress(self, uuid: str, progress: int):
+        '''Record the progress of importing a Fileset.
+
+        A single statement with no reads, suited to frequent updates. The
+        progress never decreases, so updates arriving out of order are
+        harmless.
+
+        Args:
+            uuid: UUID of the Fileset.
+            progress: Progress of the fileset import (0-100).
+
+        Raises:
+            NoResultFound: If there is no such Fileset.
+        '''
+
+        filesets = Fileset.__table__
+        updated = self.session.execute(
+            filesets.update()
+            .where(filesets.c.uuid == uuid)
+            .values(progress=func.greatest(filesets.c.progress, progress))
+        ).rowcount
+        if updated == 0:
+            raise NoResultFound('No row was found for one()')
+        self._commit()
 
     def update_repository(self, uuid: str, name: Optional[str] = None,
                           raw_storage: Optional[str] = None, access: Optional[str] = None) -> SDict:
@@ -848,8 +1665,10 @@ class Client:
         # Destroy -> Live/Archive (Data will be missing)
         # Potentially use lifecycle to delete also to protect from mistakes?
         self.session.add(repository)
-        self.session.commit()
-        return to_jsonapi(repository_schema.dump(repository))
+        self._commit()
+        if access is not None:
+            self._invalidate_permissions()
+        return to_jsonapi(compiled.repository_schema.dump(repository))
 
     def update_membership(self, group_uuid: str, user_uuid: str,
                           membership_type: Optional[str] = None) -> SDict:
@@ -879,32 +1698,40 @@ class Client:
             membership.membership_type = membership_type
 
         self.session.add(membership)
-        self.session.commit()
+        self._commit()
+        self._invalidate_permissions(user_uuid)
         return to_jsonapi(
-            membership_schema.dump(membership),
+            compiled.membership_schema.dump(membership),
             {
-                'groups': [group_schema.dump(membership.group)],
-                'users': [user_schema.dump(membership.user)]
+                'groups': [compiled.group_schema.dump(membership.group)],
+                'users': [compiled.user_schema.dump(membership.user)]
             }
         )
 
     def delete_repository(self, uuid: str):
         '''Delete a repository and all contents.
 
+        The contents are deleted by the database's foreign key cascades, so
+        none are loaded.
+
         Args:
             uuid: UUID of the repository.
+
+        Raises:
+            NoResultFound: If there is no such repository.
         '''
 
-        repository = (
+        # TODO Handle delete of raw/tiled objects in the calling method
+        # Recovery from delete?
+        deleted = (
             self.session.query(Repository)
             .filter(Repository.uuid == uuid)
-            .one()
+            .delete(synchronize_session='evaluate')
         )
-
-        # TODO Handle delete of raw/tiled objects in the calling method
-        # Recovery from delete?
-        self.session.delete(repository)
-        self.session.commit()
+        if deleted == 0:
+            raise NoResultFound('No row was found for one()')
+        self._commit()
+        self._invalidate_permissions()
 
     def delete_image(self, uuid: str):
         image = (
@@ -914,7 +1741,161 @@ class Client:
         )
         # TODO Handle delete of raw/tiled objects in a batch job
         image.deleted = True
-        self.session.commit()
+        self._commit()
+
+    def _set_images_deleted(self, deleted: bool, criterion,
+                            return_uuids: bool) -> Union[int, List[str]]:
+        '''Soft-delete or restore the images matching a criterion with a
+        single statement.
+
+        Args:
+            deleted: If the images are deleted rather than restored.
+            criterion: Criterion for the images.
+            return_uuids: Return the UUIDs of the affected images rather than
+                their number.
+
+        Returns:
+            The number or UUIDs of the images which were changed.
+        '''
+
+        images = Image.__table__
+        statement = (
+            images.update()
+            .where(criterion)
+            .where(images.c.deleted.isnot(deleted))
+            .values(deleted=deleted)
+        )
+
+        if return_uuids:
+            result = [uuid for uuid, in self.session.execute(
+                statement.returning(images.c.uuid)
+            )]
+        else:
+            result = self.session.execute(statement).rowcount
+
+        self._commit()
+        return result
+
+    def delete_images(self, uuids: Iterable[str],
+                      return_uuids: bool = False) -> Union[int, List[str]]:
+        '''Soft-delete many images.
+
+        Args:
+            uuids: UUIDs of the images.
+            return_uuids: Return the UUIDs of the deleted images rather than
+                their number. Default: `False`.
+
+        Returns:
+            The number or UUIDs of the images which were deleted, excluding
+            those which already were.
+        '''
+
+        return self._set_images_deleted(True, Image.uuid.in_(list(uuids)),
+                                        return_uuids)
+
+    def restore_images(self, uuids: Iterable[str],
+                       return_uuids: bool = False) -> Union[int, List[str]]:
+        '''Restore many soft-deleted images.
+
+        Args:
+            uuids: UUIDs of the images.
+            return_uuids: Return the UUIDs of the restored images rather than
+                their number. Default: `False`.
+
+        Returns:
+            The number or UUIDs of the images which were restored, excluding
+            those which were not deleted.
+        '''
+
+        return self._set_images_deleted(False, Image.uuid.in_(list(uuids)),
+                                        return_uuids)
+
+    def delete_images_in_fileset(
+        self,
+        fileset_uuid: str,
+        return_uuids: bool = False
+    ) -> Union[int, List[str]]:
+        '''Soft-delete the images of a Fileset.
+
+        Args:
+            fileset_uuid: UUID of the Fileset.
+            return_uuids: Return the UUIDs of the deleted images rather than
+                their number. Default: `False`.
+
+        Returns:
+            The number or UUIDs of the images which were deleted, excluding
+            those which already were.
+        '''
+
+        return self._set_images_deleted(True,
+                                        Image.fileset_uuid == fileset_uuid,
+                                        return_uuids)
+
+    def purge_deleted_images(self, batch_size: int = 100
+                             ) -> Iterator[SDict]:
+        '''Permanently delete soft-deleted images a batch at a time.
+
+        Each batch of images is claimed with `FOR UPDATE SKIP LOCKED`, so
+        several workers can purge in parallel without waiting for each
+        other. A batch is yielded so its objects can be deleted from storage,
+        and its rows, with their rendering settings, are deleted and
+        committed when the next batch is requested. Rows of a batch which is
+        not finished, because iteration stopped or failed, are kept, and are
+        locked until the session's transaction ends.
+
+        Args:
+            batch_size: Maximum number of images in each batch. Default: 100.
+
+        Returns:
+            Generator of the images in each batch, including the `keys` of
+            their filesets which will have no images left at all, as their
+            raw files are no longer needed. Keys of a fileset with other
+            deleted images are not included, as those images could still be
+            restored, so a fileset whose images are split between workers
+            purging at the same time may have its keys in neither batch.
+        '''
+
+        # Validated here, rather than when iteration starts
+        if batch_size < 1:
+            raise ValueError(f'Specified batch size invalid: {batch_size}')
+
+        q_images = (
+            self.session.query(*compiled.images_schema.columns())
+            .filter(Image.deleted.is_(True))
+            .order_by(Image.uuid)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        )
+
+        def batches():
+            while True:
+                images = compiled.images_schema.dump_rows(q_images)
+                if len(images) == 0:
+                    return
+
+                image_uuids = [image['uuid'] for image in images]
+                fileset_uuids = {image['fileset_uuid'] for image in images}
+                other_images = (
+                    self.session.query(Image)
+                    .filter(Image.fileset_uuid == Key.fileset_uuid)
+                    .filter(~Image.uuid.in_(image_uuids))
+                    .exists()
+                )
+                keys = self._list(
+                    compiled.keys_schema,
+                    Key.fileset_uuid.in_(fileset_uuids),
+                    ~other_images
+                )
+
+                yield to_jsonapi(images, {'keys': keys})
+
+                # Rendering settings are deleted by the database
+                self.session.query(Image) \
+                    .filter(Image.uuid.in_(image_uuids)) \
+                    .delete(synchronize_session=False)
+                self._commit()
+
+        return batches()
 
     def restore_image(self, uuid: str):
         image = (
@@ -923,7 +1904,7 @@ class Client:
             .one()
         )
         image.deleted = False
-        self.session.commit()
+        self._commit()
 
     def delete_membership(self, group_uuid: str, user_uuid: str):
         '''Delete a membership.
@@ -941,7 +1922,8 @@ class Client:
         )
 
         self.session.delete(membership)
-        self.session.commit()
+        self._commit()
+        self._invalidate_permissions(user_uuid)
 
     def delete_grant(self, subject_uuid, resource_uuid):
         grant = (
@@ -951,4 +1933,56 @@ class Client:
             .one()
         )
         self.session.delete(grant)
-        self.session.commit()
+        self._commit()
+        self._invalidate_permissions()
+
+    def revoke_grants(
+        self,
+        pairs: Iterable[Tuple[str, str]]
+    ) -> List[Tuple[str, str]]:
+        '''Revoke many grants at once.
+
+        The effective permissions of the repositories and then the grants
+        are locked, in the order of their repository and then subject, the
+        same order as grant_repositories_to_subjects, and then the grants
+        are deleted with a single statement.
+
+        Args:
+            pairs: Tuples of the UUID of a repository and the UUID of the
+                subject it is granted to.
+
+        Returns:
+            The pairs which were granted and have been revoked.
+        '''
+
+        pairs = set(pairs)
+        if len(pairs) == 0:
+            return []
+
+        self._lock_repository_permissions(
+            repository_uuid for repository_uuid, _ in pairs
+        )
+        grants = Grant.__table__
+        criterion = tuple_(grants.c.subject_uuid,
+                           grants.c.repository_uuid).in_([
+                               (subject_uuid, repository_uuid)
+                               for repository_uuid, subject_uuid in pairs
+                           ])
+        self.session.execute(
+            select([grants.c.subject_uuid])
+            .where(criterion)
+            .order_by(grants.c.repository_uuid, grants.c.subject_uuid)
+            .with_for_update()
+        )
+        revoked = sorted(
+            (repository_uuid, subject_uuid)
+            for subject_uuid, repository_uuid in self.session.execute(
+                grants.delete()
+                .where(criterion)
+                .returning(grants.c.subject_uuid, grants.c.repository_uuid)
+            )
+        )
+
+        self._commit()
+        self._invalidate_permissions()
+        return revoked
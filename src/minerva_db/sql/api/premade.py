@@ -1,6 +1,7 @@
 '''Premade statements'''
-from sqlalchemy.sql.expression import literal
-from ..models import Membership
+from sqlalchemy.sql.expression import func, literal
+from ..models import (User, Membership, Grant, Repository, Import, Fileset,
+                      Image, EffectivePermission)
 
 
 def q_subject_uuids(session, user_uuid):
@@ -22,3 +23,128 @@ def q_subject_uuids(session, user_uuid):
     )
 
     return q_groups.union(q_user)
+
+
+def join_resource(q, resource_type, repository_uuid):
+    '''
+    Join a query to the resources of a type within a repository.
+
+    Returns the joined query and the column of the resource UUID.
+    '''
+
+    if resource_type == 'Repository':
+        return q, repository_uuid
+    elif resource_type == 'Import':
+        q = q.join(Import, Import.repository_uuid == repository_uuid)
+        return q, Import.uuid
+    elif resource_type == 'Fileset':
+        q = (
+            q.join(Import, Import.repository_uuid == repository_uuid)
+            .join(Fileset, Fileset.import_uuid == Import.uuid)
+        )
+        return q, Fileset.uuid
+    elif resource_type == 'Image':
+        q = q.join(Image, Image.repository_uuid == repository_uuid)
+        return q, Image.uuid
+
+    raise ValueError(f'Specified resource type invalid: {resource_type}')
+
+
+def q_granted(session, user_uuid, resource_type, permission):
+    '''
+    Query for resources of a type that a user has been granted a permission
+    on, either directly or through a group.
+
+    Returns the query and the column of the resource UUID.
+    '''
+
+    if permission not in Grant.permission_type:
+        raise ValueError(f'Specified permission invalid: {permission}')
+
+    # Effective permissions already account for group membership and
+    # higher permissions imply the lower ones
+    q = (
+        session.query(EffectivePermission)
+        .filter(EffectivePermission.user_uuid == user_uuid)
+        .filter(EffectivePermission.permission >= permission)
+    )
+
+    return join_resource(q, resource_type, EffectivePermission.repository_uuid)
+
+
+def q_public(session, resource_type, permission):
+    '''
+    Query for resources of a type that everyone has a permission on because
+    their repository is public.
+
+    Returns the query and the column of the resource UUID.
+    '''
+
+    if permission not in Grant.permission_type:
+        raise ValueError(f'Specified permission invalid: {permission}')
+
+    q = (
+        session.query(Repository)
+        .filter(Repository.access.in_(Repository.public_access(permission)))
+    )
+
+    return join_resource(q, resource_type, Repository.uuid)
+
+
+def q_permitted_resources(session, user_uuid, targets):
+    '''
+    Query for the (resource_type, resource_uuid, permission) targets that a
+    user has been granted, either directly or through a group, or which are
+    public. Anonymous users have a `None` user_uuid.
+
+    Targets are grouped by resource type and sought permission so that each
+    group is a single lookup and the groups are combined with a UNION ALL.
+    '''
+
+    groups = {}
+    for resource_type, resource_uuid, permission in targets:
+        groups.setdefault((resource_type, permission), set()).add(
+            resource_uuid
+        )
+
+    queries = []
+    for (resource_type, permission), resource_uuids in sorted(groups.items()):
+        lookups = [q_public(session, resource_type, permission)]
+        if user_uuid is not None:
+            lookups.append(
+                q_granted(session, user_uuid, resource_type, permission)
+            )
+
+        for q, column in lookups:
+            queries.append(
+                q.with_entities(
+                    literal(resource_type).label('resource_type'),
+                    column.label('resource_uuid'),
+                    literal(permission).label('permission')
+                )
+                .filter(column.in_(resource_uuids))
+            )
+
+    return queries[0].union_all(*queries[1:])
+
+
+def q_effective_permissions(session):
+    '''
+    Query for the highest permission each user has on each repository,
+    calculated from the grants rather than taken from EffectivePermission.
+    '''
+
+    q_subjects = session.query(
+        User.uuid.label('user_uuid'),
+        User.uuid.label('subject_uuid')
+    ).union_all(session.query(
+        Membership.user_uuid.label('user_uuid'),
+        Membership.group_uuid.label('subject_uuid')
+    )).subquery()
+
+    return (
+        session.query(q_subjects.c.user_uuid, Grant.repository_uuid,
+                      func.max(Grant.permission))
+        .join(Grant, Grant.subject_uuid == q_subjects.c.subject_uuid)
+        .group_by(q_subjects.c.user_uuid, Grant.repository_uuid)
+    )
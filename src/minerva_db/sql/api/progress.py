@@ -0,0 +1,63 @@
+'''Coalescing of frequent fileset progress updates.'''
+import time
+from typing import Callable, Dict
+from sqlalchemy.orm.exc import NoResultFound
+
+
+class ProgressCoalescer:
+    '''Record fileset progress at most once per interval.
+
+    Progress reported in between is held in memory, and only the highest
+    value for each fileset is written when the interval has passed. There
+    is no background thread, so the pending progress is written by a later
+    `update` or by `flush`, which is also called when used as a context
+    manager.
+
+    Args:
+        client: Client through which progress is recorded.
+        interval: Minimum number of seconds between writes. Default: 1.
+        clock: Source of the time in seconds. Default: `time.monotonic`.
+    '''
+
+    def __init__(self, client, interval: float = 1.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.client = client
+        self.interval = interval
+        self.clock = clock
+        self._pending: Dict[str, int] = {}
+        self._flushed = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.flush()
+
+    def update(self, uuid: str, progress: int):
+        '''Report the progress of importing a Fileset.
+
+        Args:
+            uuid: UUID of the Fileset.
+            progress: Progress of the fileset import (0-100).
+        '''
+
+        self._pending[uuid] = max(progress, self._pending.get(uuid, progress))
+
+        now = self.clock()
+        if self._flushed is None or now - self._flushed >= self.interval:
+            self.flush()
+
+    def flush(self):
+        '''Write the pending progress of every Fileset.
+
+        The progress of a Fileset which no longer exists is discarded.
+        '''
+
+        self._flushed = self.clock()
+        # Removed only once written, so nothing is lost if writing fails
+        for uuid, progress in list(self._pending.items()):
+            try:
+                self.client.set_fileset_progress(uuid, progress)
+            except NoResultFound:
+                pass
+            del self._pending[uuid]
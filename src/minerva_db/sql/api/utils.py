@@ -1,5 +1,117 @@
-def to_jsonapi(data, included={}):
-    return {
+import base64
+import binascii
+import json
+from itertools import islice
+from typing import BinaryIO, Iterable, Iterator, List, Optional
+
+
+def to_jsonapi(data, included={}, links=None):
+    document = {
         'data': data,
         'included': included
     }
+    if links is not None:
+        document['links'] = links
+    return document
+
+
+def encode_cursor(values: List[str]) -> str:
+    '''Encode the position of a row as an opaque cursor.
+
+    Args:
+        values: Values of the columns the rows are ordered by.
+
+    Returns:
+        The cursor.
+    '''
+
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor: str, length: int) -> List[str]:
+    '''Decode a cursor made by `encode_cursor`.
+
+    Args:
+        cursor: The cursor.
+        length: Number of columns the rows are ordered by.
+
+    Returns:
+        Values of the columns the rows are ordered by.
+
+    Raises:
+        ValueError: If the cursor is invalid.
+    '''
+
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, UnicodeError, ValueError):
+        raise ValueError(f'Specified cursor invalid: {cursor}')
+    if (not isinstance(values, list) or len(values) != length
+            or not all(isinstance(value, str) for value in values)):
+        raise ValueError(f'Specified cursor invalid: {cursor}')
+    return values
+
+
+def iter_jsonapi(data: Iterable, included={}, links: Optional[dict] = None,
+                 chunk_size: int = 65536) -> Iterator[bytes]:
+    '''Encode a JSON:API document incrementally.
+
+    The output is identical to `json.dumps(to_jsonapi(...))` of the same
+    arguments, but the data is encoded an item at a time as it is iterated,
+    so the document is never held in memory as a whole. The chunks can be
+    used as a WSGI or ASGI response body.
+
+    Args:
+        data: Iterable of the items of the data, e.g. rows from an `iter_*`
+            method of the Client chained together.
+        included: Included resources.
+        links: Links of the document. Default: `None` for no links.
+        chunk_size: Approximate size in bytes of each chunk. Default: 64KiB.
+
+    Yields:
+        The encoded document in chunks.
+    '''
+
+    encode = json.JSONEncoder().encode
+    items = iter(data)
+    buffer = ['{"data": [']
+    size = 0
+    separator = ''
+    while True:
+        # Items are encoded in batches, as a list without its brackets,
+        # which is much faster than one at a time
+        batch = list(islice(items, 1000))
+        if len(batch) == 0:
+            break
+        encoded = encode(batch)[1:-1]
+        buffer.append(separator)
+        buffer.append(encoded)
+        separator = ', '
+        size += len(encoded)
+        if size >= chunk_size:
+            yield ''.join(buffer).encode()
+            buffer = []
+            size = 0
+
+    buffer.append('], "included": ')
+    buffer.append(encode(included))
+    if links is not None:
+        buffer.append(', "links": ')
+        buffer.append(encode(links))
+    buffer.append('}')
+    yield ''.join(buffer).encode()
+
+
+def dump_jsonapi(fp: BinaryIO, data: Iterable, included={},
+                 links: Optional[dict] = None):
+    '''Write a JSON:API document incrementally to a binary file.
+
+    Args:
+        fp: File-like object to write to.
+        data: Iterable of the items of the data.
+        included: Included resources.
+        links: Links of the document. Default: `None` for no links.
+    '''
+
+    for chunk in iter_jsonapi(data, included, links):
+        fp.write(chunk)
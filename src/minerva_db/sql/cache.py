@@ -0,0 +1,204 @@
+'''In-process caches for permission decisions.
+
+This module is imported by the MiniClient so it must not import the models.
+'''
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+from typing import Callable, Hashable, Optional, Tuple
+
+PermissionKey = Tuple[str, str, str]
+
+
+class TTLCache:
+    '''Bounded mapping whose entries expire a fixed time after being set.
+
+    When full, the least recently used entry is evicted.
+    '''
+
+    def __init__(self, ttl: float, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: Hashable, default=None):
+        '''Get an unexpired entry, marking it as recently used.
+
+        Args:
+            key: Key of the entry.
+            default: Value if there is no unexpired entry.
+
+        Returns:
+            The value of the entry or the default.
+        '''
+
+        try:
+            value, expires = self._entries[key]
+        except KeyError:
+            return default
+
+        if expires <= monotonic():
+            del self._entries[key]
+            return default
+
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value):
+        '''Set an entry, evicting the least recently used if full.
+
+        Args:
+            key: Key of the entry.
+            value: Value of the entry.
+        '''
+
+        if self.max_size <= 0:
+            return
+
+        self._entries[key] = (value, monotonic() + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def discard(self, predicate: Callable[[Hashable], bool]):
+        '''Remove all entries whose key matches a predicate.
+
+        Args:
+            predicate: Called with each key.
+        '''
+
+        for key in [key for key in self._entries if predicate(key)]:
+            del self._entries[key]
+
+    def clear(self):
+        '''Remove all entries.'''
+
+        self._entries.clear()
+
+
+class PermissionCache:
+    '''Cache of permission decisions keyed by (user_uuid, resource_uuid,
+    permission).
+
+    Granted and denied decisions are held separately so that denials, which
+    are more likely to change as access is given out, can be kept for a
+    shorter time. Set a max size of 0 to disable either.
+
+    The access level of the repository containing each resource is also
+    cached so that public resources can be authorized without a query.
+
+    Decisions are only invalidated within this process, so the TTLs bound how
+    long a change made elsewhere takes to be seen.
+    '''
+
+    def __init__(self, ttl: float = 300, max_size: int = 10000,
+                 negative_ttl: float = 30, negative_max_size: int = 1000,
+                 access_ttl: float = 3600, access_max_size: int = 100000):
+        self._granted = TTLCache(ttl, max_size)
+        self._denied = TTLCache(negative_ttl, negative_max_size)
+        self._access = TTLCache(access_ttl, access_max_size)
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._granted) + len(self._denied)
+
+    def get(self, key: PermissionKey) -> Optional[bool]:
+        '''Get a cached decision.
+
+        Args:
+            key: Tuple of user UUID, resource UUID and permission.
+
+        Returns:
+            The decision or `None` if it is not cached.
+        '''
+
+        with self._lock:
+            decision = self._granted.get(key)
+            if decision is None:
+                decision = self._denied.get(key)
+
+            if decision is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+
+            return decision
+
+    def set(self, key: PermissionKey, decision: bool):
+        '''Cache a decision.
+
+        Args:
+            key: Tuple of user UUID, resource UUID and permission.
+            decision: If user has permission or not.
+        '''
+
+        with self._lock:
+            if decision:
+                self._granted.set(key, True)
+            else:
+                self._denied.set(key, False)
+
+    def get_access(self, resource_uuid: str) -> Optional[str]:
+        '''Get the cached access level of a resource's repository.
+
+        Args:
+            resource_uuid: UUID of the resource.
+
+        Returns:
+            The access level or `None` if it is not cached.
+        '''
+
+        with self._lock:
+            return self._access.get(resource_uuid)
+
+    def set_access(self, resource_uuid: str, access: str):
+        '''Cache the access level of a resource's repository.
+
+        Args:
+            resource_uuid: UUID of the resource.
+            access: Access level of the repository.
+        '''
+
+        with self._lock:
+            self._access.set(resource_uuid, access)
+
+    def invalidate_user(self, user_uuid: str):
+        '''Remove all decisions for a user.
+
+        Args:
+            user_uuid: UUID of the user.
+        '''
+
+        with self._lock:
+            for cache in (self._granted, self._denied):
+                cache.discard(lambda key: key[0] == user_uuid)
+
+    def invalidate_all(self):
+        '''Remove all decisions and access levels.'''
+
+        with self._lock:
+            self._granted.clear()
+            self._denied.clear()
+            self._access.clear()
+
+    def stats(self):
+        '''Counters of the cache.
+
+        Returns:
+            Hits, misses and the number of granted, denied and access level
+            entries.
+        '''
+
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'granted': len(self._granted),
+                'denied': len(self._denied),
+                'access': len(self._access)
+            }
@@ -1,18 +1,72 @@
-from minerva_db.sql.models.membership import Membership
-from minerva_db.sql.models.repository import Repository
-from minerva_db.sql.models.image import Image
-from minerva_db.sql.models.grant import Grant
-from minerva_db.sql.models.renderingsettings import RenderingSettings
-from sqlalchemy.sql.expression import literal
+from minerva_db.sql.access import permission_type, public_access
+from minerva_db.sql.cache import PermissionCache
+from sqlalchemy.orm.exc import NoResultFound
+from sqlalchemy.sql.expression import and_, literal, select, union_all
+from typing import Optional, Tuple
+from .prepared import PreparedStatement
+from .tables import (membership, repository, import_, fileset, image,
+                     effective_permission)
 
 # Minimal database client for tile rendering API
 # The goal is to have minimal functionality / imports so that the
 # lambda cold start time of the tile rendering API would be smaller.
 # (api.client.Client imports everything, which takes too much time)
+# It is therefore built on lightweight table definitions rather than the
+# models, and its hot statements are prepared on the server.
+
+# Effective permissions already account for group membership and higher
+# permissions imply the lower ones
+_GRANTED = '''
+$1 IS NOT NULL AND EXISTS (
+    SELECT 1 FROM t_effective_permission AS e
+    WHERE e.user_uuid = $1
+    AND e.repository_uuid = r.uuid
+    AND e.permission >= CAST($3 AS permissions)
+)
+'''
+
+_image_access = PreparedStatement(
+    'minerva_image_access',
+    ['user_uuid', 'image_uuid', 'permission'],
+    f'''
+    SELECT r.access, {_GRANTED} AS granted
+    FROM t_image AS i
+    JOIN t_repository AS r ON r.uuid = i.repository_uuid
+    WHERE i.uuid = $2
+    '''
+)
+
+_authorized_image_channel_group = PreparedStatement(
+    'minerva_authorized_image_channel_group',
+    ['user_uuid', 'image_uuid', 'permission', 'channel_group_uuid'],
+    f'''
+    SELECT r.access, {_GRANTED} AS granted,
+        i.pyramid_levels, i.tile_size, i.format, i.compression,
+        i.pixel_type, i.rgb, s.channels
+    FROM t_image AS i
+    JOIN t_repository AS r ON r.uuid = i.repository_uuid
+    LEFT OUTER JOIN t_rendering_settings AS s
+        ON s.uuid = $4 AND s.image_uuid = i.uuid
+    WHERE i.uuid = $2
+    '''
+)
+
+_image_channel_group = PreparedStatement(
+    'minerva_image_channel_group',
+    ['uuid'],
+    '''
+    SELECT uuid, image_uuid, label, channels
+    FROM t_rendering_settings
+    WHERE uuid = $1
+    '''
+)
+
+
 class MiniClient:
 
-    def __init__(self, session):
+    def __init__(self, session, permission_cache: PermissionCache = None):
         self.session = session
+        self.permission_cache = permission_cache
 
     def _session(self):
         '''Get session.
@@ -23,6 +77,15 @@ class MiniClient:
 
         return self.session
 
+    def _execute(self, statement: PreparedStatement, **params):
+        '''Execute a prepared statement on the session's connection.
+
+        Returns:
+            The result.
+        '''
+
+        return statement.execute(self.session.connection(), **params)
+
     def q_subject_uuids(self, session, user_uuid):
         '''
         Query for subject_ids that apply to a user. This is all
@@ -30,64 +93,231 @@ class MiniClient:
         '''
 
         # The groups a user is a member of
-        q_groups = session.query(
-            Membership.group_uuid.label('subject_uuid')
-        ).filter(
-            Membership.user_uuid == user_uuid
+        q_groups = select([
+            membership.c.group_uuid.label('subject_uuid')
+        ]).where(
+            membership.c.user_uuid == user_uuid
         )
 
         # We already know the user id so simply add this
-        q_user = session.query(
+        q_user = select([
             literal(user_uuid).label('subject_uuid')
-        )
+        ])
 
         return q_groups.union(q_user)
 
-    def has_image_permission(self, user_uuid: str,
-                       image_uuid: str,
-                       permission='Read') -> bool:
+    def has_image_permission(self, user_uuid: Optional[str],
+                             image_uuid: str,
+                             permission='Read') -> bool:
         '''Determine if a user has a required permission on a given image.
 
         Args:
-            user_uuid: UUID of the user.
+            user_uuid: UUID of the user, `None` for an anonymous user.
             image_uuid: UUID of the Image.
             permission: Sought permission. Defaults to 'Read'
 
         Returns:
-            If user has permission or not.
+            If user has permission or not. Everyone has the permissions
+            given by a public repository.
         '''
 
-        # TODO Calculate this centrally driven from the model
-        # Caclculate the permissions which imply the requested one
-        implied = [permission]
-        if permission == 'Read':
-            implied.extend(['Write', 'Admin'])
-        if permission == 'Write':
-            implied.append('Admin')
-
-        # Calculate subjects that the user is a member of that might have the
-        # required permission granted
-        q_subject_uuids = self.q_subject_uuids(self.session, user_uuid)
-
-        # Base query
-        q = (
-            self.session.query(Grant)
-                .filter(Grant.permission.in_(implied))
-                .filter(Grant.subject_uuid.in_(q_subject_uuids))
-        )
+        if permission not in permission_type:
+            raise ValueError(f'Specified permission invalid: {permission}')
 
-        q = (
-            q.join(Grant.repository)
-                .join(Repository.images)
-                .filter(Image.uuid == image_uuid)
-        )
+        public = public_access(permission)
+        cache = self.permission_cache
+        key = (user_uuid, image_uuid, permission)
+
+        if cache is not None:
+            # The access level of an image's repository rarely changes, so
+            # public images can be authorized without a query
+            access = cache.get_access(image_uuid)
+            if access in public:
+                return True
+            if access is not None and user_uuid is None:
+                return False
 
-        # Only existence of results required
-        q = q.exists()
+            decision = cache.get(key)
+            if decision is not None:
+                return decision
 
-        return self.session.query(q).scalar()
+        access, granted = self._image_access(user_uuid, image_uuid,
+                                             permission)
+        decision = access in public or granted
+
+        if cache is not None:
+            if access is not None:
+                cache.set_access(image_uuid, access)
+            cache.set(key, decision)
+
+        return decision
+
+    def _image_access(self, user_uuid: Optional[str], image_uuid: str,
+                      permission: str) -> Tuple[Optional[str], bool]:
+        '''Get the access level of an image's repository and if a user has
+        been granted a permission on it.
+
+        Args:
+            user_uuid: UUID of the user, `None` for an anonymous user.
+            image_uuid: UUID of the Image.
+            permission: Sought permission.
+
+        Returns:
+            The access level, `None` if there is no such image, and if user
+            has been granted permission or not.
+        '''
+
+        row = self._execute(_image_access, user_uuid=user_uuid,
+                            image_uuid=str(image_uuid),
+                            permission=permission).first()
+
+        if row is None:
+            return None, False
+        return row.access, bool(row.granted)
+
+    def has_permissions(self, user_uuid: Optional[str], targets):
+        '''Determine if a user has the required permissions on many resources.
+
+        All the targets are authorized with a single statement.
+
+        Args:
+            user_uuid: UUID of the user, `None` for an anonymous user.
+            targets: Tuples of resource type, resource UUID and sought
+                permission. The resource types may be mixed.
+
+        Returns:
+            Mapping of each target to if user has permission or not.
+        '''
+
+        targets = [tuple(target) for target in targets]
+        if len(targets) == 0:
+            return {}
+
+        # One lookup per distinct resource type and permission
+        groups = {}
+        for resource_type, resource_uuid, permission in targets:
+            groups.setdefault((resource_type, permission), set()).add(
+                resource_uuid
+            )
+
+        queries = []
+        for (resource_type, permission), resource_uuids in sorted(
+                groups.items()):
+            if permission not in permission_type:
+                raise ValueError(f'Specified permission invalid: '
+                                 f'{permission}')
+
+            # Resources in public repositories
+            lookups = [(
+                repository,
+                repository.c.uuid,
+                repository.c.access.in_(public_access(permission))
+            )]
+
+            # Resources granted to the user
+            if user_uuid is not None:
+                lookups.append((
+                    effective_permission,
+                    effective_permission.c.repository_uuid,
+                    and_(effective_permission.c.user_uuid == user_uuid,
+                         effective_permission.c.permission >= permission)
+                ))
+
+            for source, repository_uuid, criterion in lookups:
+                if resource_type == 'Repository':
+                    column = repository_uuid
+                elif resource_type == 'Import':
+                    column = import_.c.uuid
+                    source = source.join(
+                        import_, import_.c.repository_uuid == repository_uuid
+                    )
+                elif resource_type == 'Fileset':
+                    column = fileset.c.uuid
+                    source = source.join(
+                        import_, import_.c.repository_uuid == repository_uuid
+                    ).join(fileset, fileset.c.import_uuid == import_.c.uuid)
+                elif resource_type == 'Image':
+                    column = image.c.uuid
+                    source = source.join(
+                        image, image.c.repository_uuid == repository_uuid
+                    )
+                else:
+                    raise ValueError(f'Specified resource type invalid: '
+                                     f'{resource_type}')
+
+                q = select([literal(resource_type), column,
+                            literal(permission)])
+                queries.append(
+                    q.select_from(source)
+                        .where(and_(criterion, column.in_(resource_uuids)))
+                )
+
+        q = union_all(*queries)
+        permitted = {tuple(row) for row in self.session.execute(q)}
+
+        return {target: target in permitted for target in targets}
 
     def get_image_channel_group(self, uuid: str):
-        rendering_setting = self.session.query(RenderingSettings) \
-            .filter(RenderingSettings.uuid == str(uuid)).one()
+        rendering_setting = self._execute(_image_channel_group,
+                                          uuid=str(uuid)).first()
+        if rendering_setting is None:
+            raise NoResultFound('No row was found for one()')
         return rendering_setting
+
+    def get_authorized_image_channel_group(self, user_uuid: Optional[str],
+                                           image_uuid: str,
+                                           channel_group_uuid: str,
+                                           permission='Read'):
+        '''Authorize a user on an image and get what is needed to render it.
+
+        The permission, the image and the channel group are all read with a
+        single statement.
+
+        Args:
+            user_uuid: UUID of the user, `None` for an anonymous user.
+            image_uuid: UUID of the Image.
+            channel_group_uuid: UUID of the image's RenderingSettings.
+            permission: Sought permission. Defaults to 'Read'
+
+        Returns:
+            `None` if user does not have permission or there is no such
+            image. Otherwise the pyramid metadata of the image and the
+            channels of the channel group, which are `None` if the image has
+            no such channel group.
+        '''
+
+        if permission not in permission_type:
+            raise ValueError(f'Specified permission invalid: {permission}')
+
+        cache = self.permission_cache
+        key = (user_uuid, image_uuid, permission)
+        if cache is not None and cache.get(key) is False:
+            return None
+
+        row = self._execute(_authorized_image_channel_group,
+                            user_uuid=user_uuid, image_uuid=str(image_uuid),
+                            permission=permission,
+                            channel_group_uuid=str(channel_group_uuid)
+                            ).first()
+
+        if row is None:
+            return None
+
+        decision = row.access in public_access(permission) or row.granted
+
+        if cache is not None:
+            cache.set_access(image_uuid, row.access)
+            cache.set(key, decision)
+
+        if not decision:
+            return None
+
+        return {
+            'pyramid_levels': row.pyramid_levels,
+            'tile_size': row.tile_size,
+            'format': row.format,
+            'compression': row.compression,
+            'pixel_type': row.pixel_type,
+            'rgb': row.rgb,
+            'channels': row.channels
+        }
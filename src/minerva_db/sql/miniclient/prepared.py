@@ -0,0 +1,69 @@
+'''Server side prepared statements.
+
+A statement is prepared on a connection the first time it is executed there
+and is executed by name afterwards, so its plan is reused for as long as the
+connection lives, e.g. across warm invocations of a Lambda.
+'''
+from sqlalchemy import text
+from typing import Sequence
+
+# Key in the connection's info of the names of the statements prepared on it,
+# or None if that is unknown because a statement failed
+_PREPARED = 'minerva_db.prepared'
+
+
+class PreparedStatement:
+    '''SQL statement to be prepared on each connection.
+
+    Args:
+        name: Name of the statement, unique within the process.
+        parameters: Names of the parameters, referred to in the SQL as `$1`,
+            `$2` etc in this order. All of them are strings.
+        sql: The SQL of the statement.
+    '''
+
+    def __init__(self, name: str, parameters: Sequence[str], sql: str):
+        self.name = name
+        binds = ', '.join(f':{parameter}' for parameter in parameters)
+        types = ', '.join('VARCHAR' for _ in parameters)
+        execute = f'EXECUTE {name} ({binds})'
+        prepare = f'PREPARE {name} ({types}) AS {sql}'
+
+        # Preparing is sent along with the first execution so it does not
+        # cost a round trip
+        self._execute = text(execute)
+        self._prepare = text(f'{prepare}; {execute}')
+        self._reprepare = text(f'DEALLOCATE ALL; {prepare}; {execute}')
+
+    def execute(self, connection, **params):
+        '''Execute the statement, preparing it first if needed.
+
+        Args:
+            connection: The SQL Alchemy Connection.
+            params: Values of the parameters.
+
+        Returns:
+            The result.
+        '''
+
+        prepared = connection.info.setdefault(_PREPARED, set())
+        if prepared is None:
+            statement = self._reprepare
+        elif self.name in prepared:
+            statement = self._execute
+        else:
+            statement = self._prepare
+
+        try:
+            result = connection.execute(statement, params)
+        except Exception:
+            # Whether the statement is prepared is now unknown, so the next
+            # execution starts again from a clean slate
+            connection.info[_PREPARED] = None
+            raise
+
+        if prepared is None:
+            connection.info[_PREPARED] = {self.name}
+        else:
+            prepared.add(self.name)
+        return result
@@ -0,0 +1,51 @@
+'''Lightweight definitions of the tables that the MiniClient reads.
+
+Only the columns that are queried are declared. These are not used to create
+the schema, which is defined by the models.
+'''
+from sqlalchemy import MetaData, Table, Column, String, Integer, Boolean
+
+metadata = MetaData()
+
+membership = Table(
+    't_membership', metadata,
+    Column('group_uuid', String(36), primary_key=True),
+    Column('user_uuid', String(36), primary_key=True)
+)
+
+repository = Table(
+    't_repository', metadata,
+    Column('uuid', String(36), primary_key=True),
+    Column('access', String)
+)
+
+import_ = Table(
+    't_import', metadata,
+    Column('uuid', String(36), primary_key=True),
+    Column('repository_uuid', String(36))
+)
+
+fileset = Table(
+    't_fileset', metadata,
+    Column('uuid', String(36), primary_key=True),
+    Column('import_uuid', String(36))
+)
+
+image = Table(
+    't_image', metadata,
+    Column('uuid', String(36), primary_key=True),
+    Column('repository_uuid', String(36)),
+    Column('pyramid_levels', Integer),
+    Column('tile_size', Integer),
+    Column('format', String(256)),
+    Column('compression', String(256)),
+    Column('pixel_type', String(256)),
+    Column('rgb', Boolean)
+)
+
+effective_permission = Table(
+    't_effective_permission', metadata,
+    Column('user_uuid', String(36), primary_key=True),
+    Column('repository_uuid', String(36), primary_key=True),
+    Column('permission', String)
+)
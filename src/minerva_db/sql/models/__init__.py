@@ -12,6 +12,7 @@ from .fileset import Fileset
 from .image import Image
 from .key import Key
 from .renderingsettings import RenderingSettings, Channel
+from .effectivepermission import EffectivePermission
 
 
 # class Obj(Base):
@@ -36,4 +37,4 @@ SubjectWithPolymorphic = with_polymorphic(Subject, [User, Group], flat=True)
 
 __all__ = ['Base', 'Membership', 'Grant', 'Subject', 'Group', 'User',
            'Repository', 'Import', 'Fileset', 'Image', 'Key', 'RenderingSettings',
-           'SubjectWithPolymorphic']
+           'EffectivePermission', 'SubjectWithPolymorphic']
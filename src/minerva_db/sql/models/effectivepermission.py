@@ -0,0 +1,223 @@
+from sqlalchemy import Column, ForeignKey, String, Enum, DDL, event
+from .base import Base
+from .grant import Grant
+
+
+class EffectivePermission(Base):
+    '''The highest permission a user has on a repository, whether granted
+    directly or through a group.
+
+    This is derived from `t_grant` and `t_membership` and is maintained by
+    database triggers, so it must not be written to directly.
+    '''
+
+    user_uuid = Column(String(36), ForeignKey('t_user.uuid',
+                                              ondelete='CASCADE'),
+                       primary_key=True)
+    repository_uuid = Column(String(36), ForeignKey('t_repository.uuid',
+                                                    ondelete='CASCADE'),
+                             primary_key=True, index=True)
+    permission = Column(Enum(*Grant.permission_type, name='permissions'),
+                        nullable=False)
+
+
+# Recalculate the effective permissions of a user, a repository or, if both
+# are NULL, everything. Rows are locked and written in the order of
+# (repository, user), so two refreshes touching the same rows wait on each
+# other rather than deadlocking
+_refresh_function = DDL('''
+CREATE OR REPLACE FUNCTION f_refresh_effective_permission(
+    p_user_uuid VARCHAR, p_repository_uuid VARCHAR
+) RETURNS VOID AS $$
+BEGIN
+    PERFORM 1 FROM t_effective_permission
+    WHERE (p_user_uuid IS NULL OR user_uuid = p_user_uuid)
+    AND (p_repository_uuid IS NULL OR repository_uuid = p_repository_uuid)
+    ORDER BY repository_uuid, user_uuid
+    FOR UPDATE;
+
+    DELETE FROM t_effective_permission
+    WHERE (p_user_uuid IS NULL OR user_uuid = p_user_uuid)
+    AND (p_repository_uuid IS NULL OR repository_uuid = p_repository_uuid);
+
+    INSERT INTO t_effective_permission (user_uuid, repository_uuid,
+                                        permission)
+    SELECT s.user_uuid, g.repository_uuid, MAX(g.permission)
+    FROM (
+        SELECT uuid AS user_uuid, uuid AS subject_uuid FROM t_user
+        UNION ALL
+        SELECT user_uuid, group_uuid AS subject_uuid FROM t_membership
+    ) AS s
+    JOIN t_grant AS g ON g.subject_uuid = s.subject_uuid
+    JOIN t_repository AS r ON r.uuid = g.repository_uuid
+    WHERE (p_user_uuid IS NULL OR s.user_uuid = p_user_uuid)
+    AND (p_repository_uuid IS NULL OR g.repository_uuid = p_repository_uuid)
+    GROUP BY g.repository_uuid, s.user_uuid
+    ORDER BY g.repository_uuid, s.user_uuid
+    ON CONFLICT (user_uuid, repository_uuid)
+    DO UPDATE SET permission = EXCLUDED.permission;
+END
+$$ LANGUAGE plpgsql;
+
+-- Serialize the refreshes of the given repositories or users with other
+-- transactions refreshing them. Each lock is held until the transaction
+-- ends, and they are taken in the order of their keys so that two
+-- transactions locking several cannot deadlock
+CREATE OR REPLACE FUNCTION f_lock_effective_permission(
+    p_namespace VARCHAR, p_uuids VARCHAR[]
+) RETURNS VOID AS $$
+DECLARE
+    v_key INTEGER;
+BEGIN
+    FOR v_key IN
+        SELECT DISTINCT hashtext(uuid) FROM unnest(p_uuids) AS uuid
+        ORDER BY 1
+    LOOP
+        PERFORM pg_advisory_xact_lock(hashtext(p_namespace), v_key);
+    END LOOP;
+END
+$$ LANGUAGE plpgsql
+''')
+
+# A grant affects every user with access to its repository. The triggers are
+# per statement, so a bulk write locks and then refreshes each repository it
+# touched once, in order. Transition tables can only be declared on single
+# event triggers, so there is one trigger per event
+_grant_trigger = DDL('''
+CREATE OR REPLACE FUNCTION f_grant_effective_permission() RETURNS TRIGGER AS $$
+DECLARE
+    v_repository_uuids VARCHAR[];
+    v_repository_uuid VARCHAR;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        SELECT array_agg(DISTINCT repository_uuid) INTO v_repository_uuids
+        FROM new_grant;
+    ELSIF TG_OP = 'UPDATE' THEN
+        SELECT array_agg(DISTINCT repository_uuid) INTO v_repository_uuids
+        FROM (
+            SELECT repository_uuid FROM old_grant
+            UNION ALL
+            SELECT repository_uuid FROM new_grant
+        ) AS g;
+    ELSE
+        SELECT array_agg(DISTINCT repository_uuid) INTO v_repository_uuids
+        FROM old_grant;
+    END IF;
+
+    PERFORM f_lock_effective_permission('repository', v_repository_uuids);
+    FOR v_repository_uuid IN
+        SELECT unnest(v_repository_uuids) ORDER BY 1
+    LOOP
+        PERFORM f_refresh_effective_permission(NULL, v_repository_uuid);
+    END LOOP;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS tr_grant_effective_permission_insert ON t_grant;
+CREATE TRIGGER tr_grant_effective_permission_insert
+AFTER INSERT ON t_grant
+REFERENCING NEW TABLE AS new_grant
+FOR EACH STATEMENT EXECUTE PROCEDURE f_grant_effective_permission();
+
+DROP TRIGGER IF EXISTS tr_grant_effective_permission_update ON t_grant;
+CREATE TRIGGER tr_grant_effective_permission_update
+AFTER UPDATE ON t_grant
+REFERENCING OLD TABLE AS old_grant NEW TABLE AS new_grant
+FOR EACH STATEMENT EXECUTE PROCEDURE f_grant_effective_permission();
+
+DROP TRIGGER IF EXISTS tr_grant_effective_permission_delete ON t_grant;
+CREATE TRIGGER tr_grant_effective_permission_delete
+AFTER DELETE ON t_grant
+REFERENCING OLD TABLE AS old_grant
+FOR EACH STATEMENT EXECUTE PROCEDURE f_grant_effective_permission()
+''')
+
+# A membership affects every repository its user has access to, so each user
+# a statement touched is locked and then refreshed once, in order
+_membership_trigger = DDL('''
+CREATE OR REPLACE FUNCTION f_membership_effective_permission()
+RETURNS TRIGGER AS $$
+DECLARE
+    v_user_uuids VARCHAR[];
+    v_user_uuid VARCHAR;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        SELECT array_agg(DISTINCT user_uuid) INTO v_user_uuids
+        FROM new_membership;
+    ELSIF TG_OP = 'UPDATE' THEN
+        -- Only a change of user or group changes any permission
+        SELECT array_agg(DISTINCT user_uuid) INTO v_user_uuids
+        FROM (
+            (SELECT user_uuid, group_uuid FROM old_membership
+             EXCEPT
+             SELECT user_uuid, group_uuid FROM new_membership)
+            UNION
+            (SELECT user_uuid, group_uuid FROM new_membership
+             EXCEPT
+             SELECT user_uuid, group_uuid FROM old_membership)
+        ) AS changed;
+    ELSE
+        SELECT array_agg(DISTINCT user_uuid) INTO v_user_uuids
+        FROM old_membership;
+    END IF;
+
+    PERFORM f_lock_effective_permission('user', v_user_uuids);
+    FOR v_user_uuid IN
+        SELECT unnest(v_user_uuids) ORDER BY 1
+    LOOP
+        PERFORM f_refresh_effective_permission(v_user_uuid, NULL);
+    END LOOP;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS tr_membership_effective_permission_insert
+ON t_membership;
+CREATE TRIGGER tr_membership_effective_permission_insert
+AFTER INSERT ON t_membership
+REFERENCING NEW TABLE AS new_membership
+FOR EACH STATEMENT EXECUTE PROCEDURE f_membership_effective_permission();
+
+DROP TRIGGER IF EXISTS tr_membership_effective_permission_update
+ON t_membership;
+CREATE TRIGGER tr_membership_effective_permission_update
+AFTER UPDATE ON t_membership
+REFERENCING OLD TABLE AS old_membership NEW TABLE AS new_membership
+FOR EACH STATEMENT EXECUTE PROCEDURE f_membership_effective_permission();
+
+DROP TRIGGER IF EXISTS tr_membership_effective_permission_delete
+ON t_membership;
+CREATE TRIGGER tr_membership_effective_permission_delete
+AFTER DELETE ON t_membership
+REFERENCING OLD TABLE AS old_membership
+FOR EACH STATEMENT EXECUTE PROCEDURE f_membership_effective_permission()
+''')
+
+# When the table is created alongside existing grants and memberships, fill
+# it, as nothing would otherwise until they next change
+_populate = DDL('''
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM t_effective_permission) THEN
+        PERFORM f_refresh_effective_permission(NULL, NULL);
+    END IF;
+END
+$$
+''')
+
+_drop_functions = DDL('''
+DROP FUNCTION IF EXISTS f_grant_effective_permission() CASCADE;
+DROP FUNCTION IF EXISTS f_membership_effective_permission() CASCADE;
+DROP FUNCTION IF EXISTS f_refresh_effective_permission(VARCHAR, VARCHAR);
+DROP FUNCTION IF EXISTS f_lock_effective_permission(VARCHAR, VARCHAR[])
+''')
+
+# The triggers are on other tables, so create them once all tables exist.
+# Every statement can be repeated, so create_all can be run again
+for ddl in (_refresh_function, _grant_trigger, _membership_trigger,
+            _populate):
+    event.listen(Base.metadata, 'after_create',
+                 ddl.execute_if(dialect='postgresql'))
+event.listen(Base.metadata, 'before_drop',
+             _drop_functions.execute_if(dialect='postgresql'))
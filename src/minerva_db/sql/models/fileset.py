@@ -1,4 +1,4 @@
-from sqlalchemy import Column, ForeignKey, String, Boolean, Integer
+from sqlalchemy import Column, ForeignKey, String, Boolean, Integer, Index
 from sqlalchemy.orm import relationship
 from .base import Base
 from .import_ import Import
@@ -11,13 +11,23 @@ class Fileset(Base):
     reader_software = Column(String(256), nullable=False)
     reader_version = Column(String(256), nullable=False)
     complete = Column(Boolean, nullable=False)
-    import_uuid = Column(String(36), ForeignKey(Import.uuid), nullable=False)
+    import_uuid = Column(String(36), ForeignKey(Import.uuid,
+                                                ondelete='CASCADE'),
+                         nullable=False, index=True)
     progress = Column(Integer, nullable=True)
 
+    # Few filesets are ever incomplete, so list_incomplete_imports reads them
+    # from a small partial index
+    __table_args__ = (
+        Index('ix_fileset_import_uuid_incomplete', import_uuid,
+              postgresql_where=~complete),
+    )
+
     import_ = relationship('Import', back_populates='filesets')
-    keys = relationship('Key', back_populates='fileset')
+    keys = relationship('Key', back_populates='fileset',
+                        passive_deletes=True)
     images = relationship('Image', back_populates='fileset',
-                          cascade='all, delete-orphan')
+                          cascade='all, delete-orphan', passive_deletes=True)
 
     def __init__(self, uuid, name, reader, reader_software, reader_version,
                  import_, complete=False, progress=0):
@@ -1,20 +1,23 @@
 from sqlalchemy import Column, ForeignKey, String, Enum
 from sqlalchemy.orm import backref, relationship
 from .base import Base
+from .. import access
 
 
 class Grant(Base):
     subject_uuid = Column(String(36), ForeignKey('t_subject.uuid'),
                           primary_key=True)
-    repository_uuid = Column(String(36), ForeignKey('t_repository.uuid'),
-                             primary_key=True)
-    permission_type = set(['Read', 'Write', 'Admin'])
+    repository_uuid = Column(String(36), ForeignKey('t_repository.uuid',
+                                                    ondelete='CASCADE'),
+                             primary_key=True, index=True)
+    permission_type = access.permission_type
     permission = Column(Enum(*permission_type, name='permissions'),
                         nullable=False)
 
     repository = relationship('Repository',
                               backref=backref('grants',
-                                              cascade='all, delete-orphan'))
+                                              cascade='all, delete-orphan',
+                                              passive_deletes=True))
     subject = relationship('Subject', back_populates='grants')
 
     def __init__(self, subject=None, repository=None, permission='Read'):
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, ForeignKey, String, Integer, Boolean
+from sqlalchemy import Column, ForeignKey, String, Integer, Boolean, Index
 from sqlalchemy.orm import relationship
 from .base import Base
 from .fileset import Fileset
@@ -10,8 +10,12 @@ class Image(Base):
     name = Column(String(256), nullable=False)
     pyramid_levels = Column(Integer, nullable=False)
     deleted = Column(Boolean, nullable=False, default=False)
-    fileset_uuid = Column(String(36), ForeignKey(Fileset.uuid), nullable=True)
-    repository_uuid = Column(String(36), ForeignKey(Repository.uuid), nullable=True)
+    fileset_uuid = Column(String(36), ForeignKey(Fileset.uuid,
+                                                 ondelete='CASCADE'),
+                          nullable=True, index=True)
+    repository_uuid = Column(String(36), ForeignKey(Repository.uuid,
+                                                    ondelete='CASCADE'),
+                             nullable=True, index=True)
     format = Column(String(256), nullable=True)
     compression = Column(String(256), nullable=True)
     tile_size = Column(Integer, nullable=False)
@@ -21,7 +25,13 @@ class Image(Base):
     fileset = relationship('Fileset', back_populates='images')
     repository = relationship('Repository', back_populates='images')
     rendering_settings = relationship('RenderingSettings', back_populates='image',
-                          cascade='all, delete-orphan')
+                          cascade='all, delete-orphan', passive_deletes=True)
+
+    # Support claiming soft-deleted images to purge
+    __table_args__ = (
+        Index('ix_image_uuid_deleted', uuid,
+              postgresql_where=deleted.is_(True)),
+    )
 
     def __init__(self, uuid, name, pyramid_levels, format, compression, tile_size, repository, fileset=None, rgb=False, pixel_type="uint16"):
         self.uuid = uuid
@@ -8,14 +8,16 @@ class Import(Base):
     uuid = Column(String(36), primary_key=True)
     name = Column(String(256), unique=True, nullable=False)
     complete = Column(Boolean, nullable=False)
-    repository_uuid = Column(String(36), ForeignKey(Repository.uuid),
-                             nullable=False)
+    repository_uuid = Column(String(36), ForeignKey(Repository.uuid,
+                                                    ondelete='CASCADE'),
+                             nullable=False, index=True)
 
     repository = relationship('Repository', back_populates='imports')
     filesets = relationship('Fileset', back_populates='import_',
-                            cascade='all, delete-orphan')
+                            cascade='all, delete-orphan',
+                            passive_deletes=True)
     keys = relationship('Key', back_populates='import_',
-                        cascade='all, delete-orphan')
+                        cascade='all, delete-orphan', passive_deletes=True)
 
     def __init__(self, uuid, name, repository, complete=False):
         self.uuid = uuid
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, ForeignKey, String
+from sqlalchemy import Column, ForeignKey, String, Index
 from sqlalchemy.orm import relationship
 from .base import Base
 from .fileset import Fileset
@@ -7,13 +7,22 @@ from .import_ import Import
 
 class Key(Base):
     key = Column(String(1024), primary_key=True, nullable=False)
-    import_uuid = Column(String(36), ForeignKey(Import.uuid), primary_key=True,
-                         nullable=False)
-    fileset_uuid = Column(String(36), ForeignKey(Fileset.uuid))
+    import_uuid = Column(String(36), ForeignKey(Import.uuid,
+                                                ondelete='CASCADE'),
+                         primary_key=True, nullable=False)
+    fileset_uuid = Column(String(36), ForeignKey(Fileset.uuid,
+                                                 ondelete='SET NULL'))
 
     import_ = relationship('Import', back_populates='keys')
     fileset = relationship('Fileset', back_populates='keys')
 
+    # Support listing the keys of an import or fileset a page at a time
+    __table_args__ = (
+        Index('ix_key_import_uuid_key', import_uuid, key),
+        Index('ix_key_fileset_uuid_import_uuid_key', fileset_uuid,
+              import_uuid, key),
+    )
+
     def __init__(self, key, import_, fileset=None):
         self.key = key
         self.import_ = import_
@@ -6,8 +6,10 @@ from .base import Base
 class Membership(Base):
     group_uuid = Column(String(36), ForeignKey('t_group.uuid'),
                         primary_key=True)
-    user_uuid = Column(String(36), ForeignKey('t_user.uuid'), primary_key=True)
-    membership_type_type = set(['Member', 'Owner'])
+    user_uuid = Column(String(36), ForeignKey('t_user.uuid'), primary_key=True,
+                       index=True)
+    # Ordered from lowest to highest, as for access.permission_type
+    membership_type_type = ('Member', 'Owner')
     membership_type = Column(
         Enum(*membership_type_type, name='membershiptypes'),
         nullable=False
@@ -25,7 +25,8 @@ class Channel:
 
 class RenderingSettings(Base):
     uuid = Column(String(36), primary_key=True)
-    image_uuid = Column(String(36), ForeignKey(Image.uuid), nullable=False, index=True)
+    image_uuid = Column(String(36), ForeignKey(Image.uuid, ondelete='CASCADE'),
+                        nullable=False, index=True)
     label = Column(String(255))
     channels = Column(JSONB, nullable=False)
 
@@ -2,6 +2,7 @@ from sqlalchemy import Column, String, Enum
 from sqlalchemy.ext.associationproxy import association_proxy
 from sqlalchemy.orm import relationship
 from .base import Base
+from .. import access as access_
 
 
 class Repository(Base):
@@ -17,16 +18,31 @@ class Repository(Base):
         Enum(*access_type, name='accesstypes'),
         nullable=False
     )
+    public_permission = access_.public_permission
 
     # association proxy of 'memberships' collection to 'group' attribute
     subjects = association_proxy('grants', 'subject')
+    # Contents are deleted by the database, without being loaded
     imports = relationship('Import', back_populates='repository',
-                           cascade='all, delete-orphan')
+                           cascade='all, delete-orphan', passive_deletes=True)
     images = relationship('Image', back_populates='repository',
-                          cascade='all, delete-orphan')
+                          cascade='all, delete-orphan', passive_deletes=True)
 
     def __init__(self, uuid, name, raw_storage=None, access="Private"):
         self.uuid = uuid
         self.name = name
         self.raw_storage = 'Archive' if raw_storage is None else raw_storage
         self.access = access
+
+    @classmethod
+    def public_access(cls, permission):
+        '''Access levels which give everyone a permission.
+
+        Args:
+            permission: Sought permission.
+
+        Returns:
+            The access levels, empty if the permission is never public.
+        '''
+
+        return access_.public_access(permission)
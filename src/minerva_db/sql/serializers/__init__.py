@@ -1,14 +1,56 @@
-from .membership import MembershipSchema, membership_schema, memberships_schema
-from .grant import GrantSchema, grant_schema, grants_schema
-from .group import GroupSchema, group_schema, groups_schema
-from .user import UserSchema, user_schema, users_schema
-from .repository import (RepositorySchema, repository_schema,
-                         repositories_schema)
-from .import_ import ImportSchema, import_schema, imports_schema
-from .fileset import FilesetSchema, fileset_schema, filesets_schema
-from .image import ImageSchema, image_schema, images_schema
-from .key import KeySchema, key_schema, keys_schema
-from .renderingsettings import RenderingSettingsSchema, rendering_settings_schema
+'''Serializers for the models.
+
+Defining a schema inspects its model's mapper, so each module of schemas is
+only imported when one of its names is first accessed.
+'''
+from importlib import import_module
+
+# The module which defines each name
+_modules = {
+    'MembershipSchema': 'membership',
+    'membership_schema': 'membership',
+    'memberships_schema': 'membership',
+    'GrantSchema': 'grant',
+    'grant_schema': 'grant',
+    'grants_schema': 'grant',
+    'GroupSchema': 'group',
+    'group_schema': 'group',
+    'groups_schema': 'group',
+    'UserSchema': 'user',
+    'user_schema': 'user',
+    'users_schema': 'user',
+    'RepositorySchema': 'repository',
+    'repository_schema': 'repository',
+    'repositories_schema': 'repository',
+    'ImportSchema': 'import_',
+    'import_schema': 'import_',
+    'imports_schema': 'import_',
+    'FilesetSchema': 'fileset',
+    'fileset_schema': 'fileset',
+    'filesets_schema': 'fileset',
+    'ImageSchema': 'image',
+    'image_schema': 'image',
+    'images_schema': 'image',
+    'KeySchema': 'key',
+    'key_schema': 'key',
+    'keys_schema': 'key',
+    'RenderingSettingsSchema': 'renderingsettings',
+    'rendering_settings_schema': 'renderingsettings'
+}
+
+
+def __getattr__(name):
+    try:
+        module = _modules[name]
+    except KeyError:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    value = getattr(import_module(f'.{module}', __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_modules))
 
 
 __all__ = [
@@ -0,0 +1,206 @@
+'''Fast serializers equivalent to the marshmallow schemas.
+
+A dump function is generated for each model from its mapper's column
+properties, following the same rules as the schemas: relationships and
+`satype` are excluded and, unless `include_fk` is set, so are columns which
+are only foreign keys. Values are converted as the marshmallow fields chosen
+for each column type would convert them, so the output is identical. Keys
+are in the order of the mapper's properties, whereas marshmallow's order
+varies with the hash seed.
+
+The function is generated on first use, so importing this module neither
+imports marshmallow nor configures the mappers.
+'''
+from sqlalchemy import Boolean, Enum, Integer, String, func, literal
+from sqlalchemy.sql.expression import literal_column
+from sqlalchemy.dialects.postgresql import JSON, JSONB
+from ..models import (Membership, Grant, Group, User, Repository, Import,
+                      Fileset, Image, Key, RenderingSettings)
+
+# Conversion of a value for each column type, in the order of precedence in
+# which marshmallow-sqlalchemy chooses a field. `None` is passed through.
+_conversions = [
+    (Enum, None),
+    (JSONB, None),
+    (JSON, None),
+    (Boolean, 'bool'),
+    (Integer, 'int'),
+    (String, 'str')
+]
+
+
+_missing = object()
+
+
+def _conversion(column):
+    for type_, conversion in _conversions:
+        if isinstance(column.type, type_):
+            return conversion
+    raise TypeError(f'No serializer for column {column} of type '
+                    f'{column.type!r}')
+
+
+class CompiledSchema:
+    '''Serializer of a model with the same output as a marshmallow
+    `ModelSchema`.
+
+    Args:
+        model: The model to serialize.
+        include_fk: If columns which are only foreign keys are included.
+        many: If a list of objects is serialized.
+    '''
+
+    def __init__(self, model, include_fk: bool = False, many: bool = False):
+        self.model = model
+        self.include_fk = include_fk
+        self.many = many
+        self._dump = None
+        self._dump_row = None
+
+    def fields(self):
+        '''Serialized property keys and the conversion of their values.
+
+        Returns:
+            List of tuples of key and the name of the conversion, `None` if
+            the value is not converted.
+        '''
+
+        fields = []
+        for prop in self.model.__mapper__.iterate_properties:
+            if hasattr(prop, 'direction') or prop.key == 'satype':
+                continue
+            if not hasattr(prop, 'columns'):
+                continue
+            if not self.include_fk and all(column.foreign_keys
+                                           for column in prop.columns):
+                continue
+            fields.append((prop.key, _conversion(prop.columns[0])))
+        return fields
+
+    def columns(self):
+        '''Columns of the serialized properties.
+
+        Returns:
+            List of columns in the same order as the fields.
+        '''
+
+        return [getattr(self.model, key).expression
+                for key, _ in self.fields()]
+
+    def json_object(self):
+        '''Expression which serializes a row in the database.
+
+        Returns:
+            JSON object of the row, with the same keys and values as `dump`.
+        '''
+
+        args = []
+        for (key, _), column in zip(self.fields(), self.columns()):
+            args.extend([literal(key), column])
+        return func.json_build_object(*args)
+
+    def json_array(self):
+        '''Aggregate expression which serializes rows in the database.
+
+        Returns:
+            JSON array of the rows, empty if there are none.
+        '''
+
+        return func.coalesce(func.json_agg(self.json_object()),
+                             literal_column("'[]'::json"))
+
+    def _compile(self):
+        # Loaded values are read from the instance's dictionary, which is
+        # much faster than through the instrumented attributes. Those which
+        # are not loaded, e.g. because they have expired, are read through
+        # the attributes so they are loaded as usual.
+        lines = ['def dump(obj):', '    d = obj.__dict__']
+        items = []
+        for i, (key, conversion) in enumerate(self.fields()):
+            lines.append(f'    v{i} = d.get({key!r}, missing)')
+            lines.append(f'    if v{i} is missing:')
+            lines.append(f'        v{i} = obj.{key}')
+            if conversion is None:
+                items.append(f'{key!r}: v{i}')
+            else:
+                items.append(f'{key!r}: None if v{i} is None '
+                             f'else {conversion}(v{i})')
+        lines.append('    return {' + ', '.join(items) + '}')
+
+        namespace = {'missing': _missing}
+        exec('\n'.join(lines), namespace)
+        return namespace['dump']
+
+    def _compile_row(self):
+        fields = self.fields()
+        values = ', '.join(f'v{i}' for i in range(len(fields)))
+        lines = ['def dump_row(row):', f'    {values}, = row']
+        items = []
+        for i, (key, conversion) in enumerate(fields):
+            if conversion is None:
+                items.append(f'{key!r}: v{i}')
+            else:
+                items.append(f'{key!r}: None if v{i} is None '
+                             f'else {conversion}(v{i})')
+        lines.append('    return {' + ', '.join(items) + '}')
+
+        namespace = {}
+        exec('\n'.join(lines), namespace)
+        return namespace['dump_row']
+
+    def dump_rows(self, rows):
+        '''Serialize result rows selecting the `columns`, without loading
+        any objects.
+
+        Args:
+            rows: The rows.
+
+        Returns:
+            List of dictionaries.
+        '''
+
+        if self._dump_row is None:
+            self._dump_row = self._compile_row()
+        dump_row = self._dump_row
+
+        return [dump_row(row) for row in rows]
+
+    def dump(self, obj):
+        '''Serialize an object, or a list of objects if `many` is set.
+
+        Args:
+            obj: The object or objects.
+
+        Returns:
+            Dictionary of the object or list of dictionaries.
+        '''
+
+        if self._dump is None:
+            self._dump = self._compile()
+        dump = self._dump
+
+        if self.many:
+            return [dump(o) for o in obj]
+        return dump(obj)
+
+
+membership_schema = CompiledSchema(Membership, include_fk=True)
+memberships_schema = CompiledSchema(Membership, include_fk=True, many=True)
+grant_schema = CompiledSchema(Grant, include_fk=True)
+grants_schema = CompiledSchema(Grant, include_fk=True, many=True)
+group_schema = CompiledSchema(Group)
+groups_schema = CompiledSchema(Group, many=True)
+user_schema = CompiledSchema(User)
+users_schema = CompiledSchema(User, many=True)
+repository_schema = CompiledSchema(Repository)
+repositories_schema = CompiledSchema(Repository, many=True)
+import_schema = CompiledSchema(Import, include_fk=True)
+imports_schema = CompiledSchema(Import, include_fk=True, many=True)
+fileset_schema = CompiledSchema(Fileset, include_fk=True)
+filesets_schema = CompiledSchema(Fileset, include_fk=True, many=True)
+image_schema = CompiledSchema(Image, include_fk=True)
+images_schema = CompiledSchema(Image, include_fk=True, many=True)
+key_schema = CompiledSchema(Key, include_fk=True)
+keys_schema = CompiledSchema(Key, include_fk=True, many=True)
+rendering_settings_schema = CompiledSchema(RenderingSettings,
+                                           include_fk=True, many=True)
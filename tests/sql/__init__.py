@@ -46,3 +46,35 @@ def statement_log(connection: Connection) -> List[Type[Executable]]:
         yield statements
     finally:
         event.remove(connection, "before_execute", before_execute)
+
+
+@contextmanager
+def query_plans(connection: Connection) -> List[str]:
+    '''For the duration of this context, record the plans of the executed
+    queries.
+
+    The plans are obtained by explaining each query, update, delete and
+    execution of a prepared statement just before it is executed.
+
+    Args:
+        connection: The SQL Alchemy Connection.
+
+    Yields:
+        The current list of plans, each as text.
+    '''
+
+    plans = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context,
+                              executemany):
+        sql = statement.lstrip().upper()
+        if sql.startswith(('SELECT', 'UPDATE', 'DELETE', 'EXECUTE')):
+            cursor.execute(f'EXPLAIN {statement}', parameters)
+            plans.append('\n'.join(row[0] for row in cursor.fetchall()))
+
+    event.listen(connection, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield plans
+    finally:
+        event.remove(connection, 'before_cursor_execute',
+                     before_cursor_execute)
@@ -0,0 +1,181 @@
+import pytest
+from src.minerva_db.sql import cache as cache_module
+from src.minerva_db.sql.api import Client
+from src.minerva_db.sql.cache import PermissionCache, TTLCache
+from src.minerva_db.sql.miniclient.miniclient import MiniClient
+from . import statement_log
+
+
+@pytest.fixture
+def clock(monkeypatch):
+
+    class Clock():
+        now = 1000.0
+
+    monkeypatch.setattr(cache_module, 'monotonic', lambda: Clock.now)
+    return Clock
+
+
+@pytest.fixture
+def permission_cache():
+    return PermissionCache()
+
+
+@pytest.fixture
+def cached_miniclient(session, permission_cache):
+    return MiniClient(session, permission_cache=permission_cache)
+
+
+@pytest.fixture
+def cached_client(session, permission_cache):
+    return Client(session, permission_cache=permission_cache)
+
+
+class TestTTLCache():
+
+    def test_get(self, clock):
+        cache = TTLCache(10, 10)
+        cache.set('a', 1)
+        assert 1 == cache.get('a')
+        assert cache.get('b') is None
+
+    def test_expiry(self, clock):
+        cache = TTLCache(10, 10)
+        cache.set('a', 1)
+        clock.now += 10
+        assert cache.get('a') is None
+        assert 0 == len(cache)
+
+    def test_eviction(self, clock):
+        cache = TTLCache(10, 2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        assert 1 == cache.get('a')
+        assert cache.get('b') is None
+        assert 3 == cache.get('c')
+
+    def test_disabled(self, clock):
+        cache = TTLCache(10, 0)
+        cache.set('a', 1)
+        assert cache.get('a') is None
+
+
+class TestPermissionCache():
+
+    def test_counters(self, clock, permission_cache):
+        key = ('user', 'image', 'Read')
+        assert permission_cache.get(key) is None
+        permission_cache.set(key, True)
+        assert permission_cache.get(key) is True
+        assert {
+            'hits': 1,
+            'misses': 1,
+            'granted': 1,
+            'denied': 0,
+            'access': 0
+        } == permission_cache.stats()
+
+    def test_negative_ttl(self, clock):
+        permission_cache = PermissionCache(ttl=300, negative_ttl=30)
+        permission_cache.set(('user', 'image1', 'Read'), True)
+        permission_cache.set(('user', 'image2', 'Read'), False)
+        assert permission_cache.get(('user', 'image2', 'Read')) is False
+        clock.now += 30
+        assert permission_cache.get(('user', 'image1', 'Read')) is True
+        assert permission_cache.get(('user', 'image2', 'Read')) is None
+
+    def test_invalidate_user(self, clock, permission_cache):
+        permission_cache.set(('user1', 'image', 'Read'), True)
+        permission_cache.set(('user2', 'image', 'Read'), False)
+        permission_cache.invalidate_user('user1')
+        assert permission_cache.get(('user1', 'image', 'Read')) is None
+        assert permission_cache.get(('user2', 'image', 'Read')) is False
+
+
+class TestCachedImagePermission():
+
+    def test_cached(self, connection, cached_miniclient,
+                    group_granted_read_hierarchy):
+        user_uuid = group_granted_read_hierarchy['user_uuid']
+        image_uuid = group_granted_read_hierarchy['image_uuid']
+        assert cached_miniclient.has_image_permission(user_uuid, image_uuid)
+        with statement_log(connection) as statements:
+            assert cached_miniclient.has_image_permission(user_uuid,
+                                                          image_uuid)
+            assert len(statements) == 0
+
+    def test_invalidated_by_delete_membership(self, cached_miniclient,
+                                              cached_client,
+                                              group_granted_read_hierarchy):
+        user_uuid = group_granted_read_hierarchy['user_uuid']
+        group_uuid = group_granted_read_hierarchy['group_uuid']
+        image_uuid = group_granted_read_hierarchy['image_uuid']
+        assert cached_miniclient.has_image_permission(user_uuid, image_uuid)
+        cached_client.delete_membership(group_uuid, user_uuid)
+        assert not cached_miniclient.has_image_permission(user_uuid,
+                                                          image_uuid)
+
+    def test_invalidated_by_grant(self, cached_miniclient, cached_client,
+                                  user_granted_read_hierarchy):
+        user_uuid = user_granted_read_hierarchy['user_uuid']
+        repository_uuid = user_granted_read_hierarchy['repository_uuid']
+        image_uuid = user_granted_read_hierarchy['image_uuid']
+        assert not cached_miniclient.has_image_permission(user_uuid,
+                                                          image_uuid,
+                                                          'Write')
+        cached_client.grant_repository_to_subject(repository_uuid, user_uuid,
+                                                  'Write')
+        assert cached_miniclient.has_image_permission(user_uuid, image_uuid,
+                                                      'Write')
+
+    def test_invalidated_by_delete_grant(self, cached_miniclient,
+                                         cached_client,
+                                         user_granted_read_hierarchy):
+        user_uuid = user_granted_read_hierarchy['user_uuid']
+        repository_uuid = user_granted_read_hierarchy['repository_uuid']
+        image_uuid = user_granted_read_hierarchy['image_uuid']
+        assert cached_miniclient.has_image_permission(user_uuid, image_uuid)
+        cached_client.delete_grant(user_uuid, repository_uuid)
+        assert not cached_miniclient.has_image_permission(user_uuid,
+                                                          image_uuid)
+
+
+class TestCachedPublicImagePermission():
+
+    @pytest.fixture
+    def public_hierarchy(self, session, user_granted_read_hierarchy):
+        user_granted_read_hierarchy['repository'].access = 'PublicRead'
+        session.commit()
+        return user_granted_read_hierarchy
+
+    def test_public_after_warm_up(self, connection, cached_miniclient,
+                                  db_user, public_hierarchy):
+        user_uuid = db_user.uuid
+        image_uuid = public_hierarchy['image_uuid']
+        assert cached_miniclient.has_image_permission(None, image_uuid)
+        with statement_log(connection) as statements:
+            assert cached_miniclient.has_image_permission(None, image_uuid)
+            assert cached_miniclient.has_image_permission(user_uuid,
+                                                          image_uuid)
+            assert len(statements) == 0
+
+    def test_anonymous_private_after_warm_up(self, connection,
+                                             cached_miniclient,
+                                             user_granted_read_hierarchy):
+        image_uuid = user_granted_read_hierarchy['image_uuid']
+        assert not cached_miniclient.has_image_permission(None, image_uuid)
+        with statement_log(connection) as statements:
+            assert not cached_miniclient.has_image_permission(None,
+                                                              image_uuid)
+            assert len(statements) == 0
+
+    def test_invalidated_by_update_repository(self, cached_miniclient,
+                                              cached_client,
+                                              public_hierarchy):
+        image_uuid = public_hierarchy['image_uuid']
+        assert cached_miniclient.has_image_permission(None, image_uuid)
+        cached_client.update_repository(public_hierarchy['repository_uuid'],
+                                        access='Private')
+        assert not cached_miniclient.has_image_permission(None, image_uuid)
@@ -105,6 +105,9 @@ class ImageFactory(Factory):
     uuid = LazyAttribute(lambda o: o.name.lower().replace(' ', '_'))
     name = Sequence(lambda n: f'image{n}')
     pyramid_levels = 1
+    format = 'tiff'
+    compression = 'zlib'
+    tile_size = 1024
     fileset = SubFactory(FilesetFactory)
     repository = SubFactory(RepositoryFactory)
 
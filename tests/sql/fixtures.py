@@ -2,6 +2,7 @@ import pytest
 from sqlalchemy.orm import Session
 from sqlalchemy import event, create_engine
 from src.minerva_db.sql.api import Client
+from src.minerva_db.sql.miniclient.miniclient import MiniClient
 from src.minerva_db.sql.models import Base
 from .factories import (GroupFactory, UserFactory, MembershipFactory,
                         MembershipOwnerFactory, RepositoryFactory,
@@ -90,6 +91,40 @@ def client(session):
     return Client(session)
 
 
+@pytest.fixture
+def committed_engine(postgres):
+    '''An engine whose schema is committed, so that it is shared by all its
+    connections, for tests which need concurrent transactions.
+
+    The schema is created in its own namespace, separate from the one the
+    `connection` fixture creates and never commits, and dropped afterwards.
+
+    Args:
+        postgres: The database URL.
+
+    Yields:
+        The engine.
+    '''
+
+    schema = 'test_committed'
+    engine = create_engine(
+        postgres, connect_args={'options': f'-c search_path={schema}'}
+    )
+    with engine.begin() as connection:
+        connection.execute(f'DROP SCHEMA IF EXISTS {schema} CASCADE')
+        connection.execute(f'CREATE SCHEMA {schema}')
+        Base.metadata.create_all(connection)
+    yield engine
+    with engine.begin() as connection:
+        connection.execute(f'DROP SCHEMA {schema} CASCADE')
+    engine.dispose()
+
+
+@pytest.fixture
+def miniclient(session):
+    return MiniClient(session)
+
+
 @pytest.fixture(scope='session')
 def statements_base(connection):
 
@@ -1,5 +1,16 @@
+import json
 import pytest
+from random import Random
+from threading import Thread
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.exc import NoResultFound
+from src.minerva_db.sql.api import Client
 from src.minerva_db.sql.api.utils import to_jsonapi
+from src.minerva_db.sql.models import (Base, EffectivePermission, Grant,
+                                       Membership)
+from .factories import (GrantAdminFactory, GroupFactory, MembershipFactory,
+                        RepositoryFactory, UserFactory)
 from . import sa_obj_to_dict, statement_log
 
 
@@ -94,6 +105,21 @@ class TestGrants():
                                          'Admin')
         assert True is decision
 
+    @pytest.mark.parametrize('permission', ['Read', 'Write', 'Admin'])
+    def test_image_implied(self, client, fixture_name, permission,
+                           standalone_image_permissions_admin):
+        user_uuid = standalone_image_permissions_admin['user'].uuid
+        image_uuid = standalone_image_permissions_admin['image'].uuid
+        decision = client.has_permission(user_uuid, 'Image', image_uuid,
+                                         permission)
+        assert True is decision
+
+    def test_invalid_permission(self, client, fixture_name, request):
+        hierarchy = request.getfixturevalue(fixture_name)
+        with pytest.raises(ValueError):
+            client.has_permission(hierarchy['user_uuid'], 'Image',
+                                  hierarchy['image_uuid'], 'Owner')
+
     def test_image_insufficent(self, client, fixture_name, request):
         hierarchy = request.getfixturevalue(fixture_name)
         user_uuid = hierarchy['user'].uuid
@@ -110,6 +136,74 @@ class TestGrants():
                                          'Read')
         assert False is decision
 
+    def test_has_permissions(self, client, fixture_name, request):
+        hierarchy = request.getfixturevalue(fixture_name)
+        user_uuid = hierarchy['user'].uuid
+        targets = [
+            ('Repository', hierarchy['repository_uuid'], 'Read'),
+            ('Repository', hierarchy['repository_uuid'], 'Write'),
+            ('Import', hierarchy['import_uuid'], 'Read'),
+            ('Fileset', hierarchy['fileset_uuid'], 'Read'),
+            ('Image', hierarchy['image_uuid'], 'Read'),
+            ('Image', hierarchy['image_uuid'], 'Admin'),
+            ('Image', 'nonexistant', 'Read')
+        ]
+        assert {
+            targets[0]: True,
+            targets[1]: False,
+            targets[2]: True,
+            targets[3]: True,
+            targets[4]: True,
+            targets[5]: False,
+            targets[6]: False
+        } == client.has_permissions(user_uuid, targets)
+
+    def test_has_permissions_matches_has_permission(self, client, db_user,
+                                                    fixture_name, request):
+        hierarchy = request.getfixturevalue(fixture_name)
+        targets = [
+            (resource_type, hierarchy[f'{key}_uuid'], permission)
+            for resource_type, key in [('Repository', 'repository'),
+                                       ('Import', 'import'),
+                                       ('Fileset', 'fileset'),
+                                       ('Image', 'image')]
+            for permission in ['Read', 'Write', 'Admin']
+        ]
+        for user_uuid in [hierarchy['user_uuid'], db_user.uuid]:
+            decisions = client.has_permissions(user_uuid, targets)
+            for target in targets:
+                assert client.has_permission(user_uuid, *target) is \
+                    decisions[target]
+
+    def test_has_permissions_query_count(self, connection, client,
+                                         fixture_name, request):
+        hierarchy = request.getfixturevalue(fixture_name)
+        targets = [('Repository', hierarchy['repository_uuid'], 'Read'),
+                   ('Image', hierarchy['image_uuid'], 'Read'),
+                   ('Fileset', hierarchy['fileset_uuid'], 'Write')]
+        with statement_log(connection) as statements:
+            client.has_permissions(hierarchy['user_uuid'], targets)
+            assert len(statements) == 1
+
+    def test_has_permissions_miniclient(self, miniclient, fixture_name,
+                                        request):
+        hierarchy = request.getfixturevalue(fixture_name)
+        targets = [('Import', hierarchy['import_uuid'], 'Read'),
+                   ('Image', hierarchy['image_uuid'], 'Read'),
+                   ('Image', hierarchy['image_uuid'], 'Write')]
+        assert {
+            targets[0]: True,
+            targets[1]: True,
+            targets[2]: False
+        } == miniclient.has_permissions(hierarchy['user_uuid'], targets)
+
+    def test_has_permissions_empty(self, client, fixture_name):
+        assert {} == client.has_permissions('nonexistant', [])
+
+    def test_has_permissions_invalid_type(self, client, fixture_name):
+        with pytest.raises(ValueError):
+            client.has_permissions('nonexistant', [('Key', 'key', 'Read')])
+
 
 class TestLists():
 
@@ -169,3 +263,443 @@ class TestLists():
         with statement_log(connection) as statements:
             client.list_repositories_for_user(user_uuid)
             assert len(statements) == 1
+
+    @pytest.mark.parametrize('fixture_name', ['user_granted_read_hierarchy',
+                                              'group_granted_read_hierarchy'])
+    def test_list_repositories_for_user_as_json(self, connection, client,
+                                                fixture_name, request):
+        user_uuid = request.getfixturevalue(fixture_name)['user_uuid']
+        with statement_log(connection) as statements:
+            document = client.list_repositories_for_user(user_uuid,
+                                                         as_json=True)
+            assert len(statements) == 1
+        assert client.list_repositories_for_user(user_uuid) == json.loads(
+            document
+        )
+
+    def test_list_repositories_for_user_as_json_none(self, client, db_user):
+        assert to_jsonapi([], {
+            'repositories': []
+        }) == json.loads(client.list_repositories_for_user(db_user.uuid,
+                                                           as_json=True))
+
+    @pytest.mark.parametrize('fixture_name', ['user_granted_read_hierarchy',
+                                              'group_granted_read_hierarchy'])
+    def test_list_grants_for_repository_as_json(self, connection, client,
+                                                fixture_name, request):
+        repository_uuid = request.getfixturevalue(
+            fixture_name
+        )['repository_uuid']
+        with statement_log(connection) as statements:
+            document = client.list_grants_for_repository(repository_uuid,
+                                                         as_json=True)
+            assert len(statements) == 1
+        assert client.list_grants_for_repository(
+            repository_uuid
+        ) == json.loads(document)
+
+
+class TestGrantRepository():
+
+    def test_grant(self, client, session, db_user, db_repository):
+        d = {
+            'subject_uuid': db_user.uuid,
+            'repository_uuid': db_repository.uuid,
+            'permission': 'Read'
+        }
+        assert to_jsonapi(d) == client.grant_repository_to_subject(
+            db_repository.uuid, db_user.uuid, 'read'
+        )
+        grant = session.query(Grant).one()
+        assert d == sa_obj_to_dict(grant, d.keys())
+
+    def test_grant_update(self, client, session, user_granted_read_hierarchy):
+        hierarchy = user_granted_read_hierarchy
+        grant = hierarchy['grant']
+        assert 'Read' == grant.permission
+        assert to_jsonapi({
+            'subject_uuid': hierarchy['user_uuid'],
+            'repository_uuid': hierarchy['repository_uuid'],
+            'permission': 'Admin'
+        }) == client.grant_repository_to_subject(hierarchy['repository_uuid'],
+                                                 hierarchy['user_uuid'],
+                                                 'Admin')
+        assert 'Admin' == grant.permission
+        assert 1 == session.query(Grant).count()
+
+    def test_grant_query_count(self, connection, client, db_user,
+                               db_repository):
+        user_uuid = db_user.uuid
+        repository_uuid = db_repository.uuid
+        with statement_log(connection) as statements:
+            client.grant_repository_to_subject(repository_uuid, user_uuid,
+                                               'Read')
+            assert len(statements) == 1
+
+    def test_grant_nonexistant_repository(self, client, db_user):
+        with pytest.raises(NoResultFound):
+            client.grant_repository_to_subject('nonexistant', db_user.uuid,
+                                               'Read')
+
+    def test_grant_nonexistant_subject(self, client, db_repository):
+        with pytest.raises(NoResultFound):
+            client.grant_repository_to_subject(db_repository.uuid,
+                                               'nonexistant', 'Read')
+
+
+class TestBulkGrants():
+
+    @pytest.fixture
+    def pairs(self, session, db_users, db_group):
+        repositories = RepositoryFactory.create_batch(2)
+        session.add_all(repositories)
+        session.commit()
+        return [
+            (repository.uuid, subject.uuid)
+            for repository in repositories
+            for subject in [*db_users, db_group]
+        ]
+
+    def test_grant(self, client, session, pairs):
+        assert {
+            'created': sorted(pairs),
+            'updated': [],
+            'unchanged': []
+        } == client.grant_repositories_to_subjects(pairs, 'read')
+        assert set(pairs) == {
+            (grant.repository_uuid, grant.subject_uuid)
+            for grant in session.query(Grant).filter(
+                Grant.permission == 'Read'
+            )
+        }
+
+    def test_grant_updated_unchanged(self, client, pairs):
+        client.grant_repositories_to_subjects(pairs[:2], 'Read')
+        client.grant_repositories_to_subjects(pairs[2:3], 'Write')
+        result = client.grant_repositories_to_subjects(pairs[:4], 'Write')
+        assert sorted(pairs[:2]) == sorted(result['updated'])
+        assert [pairs[2]] == result['unchanged']
+        assert [pairs[3]] == result['created']
+
+    def test_grant_effective(self, client, session, db_users, pairs):
+        client.grant_repositories_to_subjects(pairs, 'Admin')
+        assert 2 == session.query(EffectivePermission) \
+            .filter(EffectivePermission.user_uuid == db_users[0].uuid) \
+            .filter(EffectivePermission.permission == 'Admin') \
+            .count()
+
+    def test_grant_query_count(self, connection, client, pairs):
+        with statement_log(connection) as statements:
+            client.grant_repositories_to_subjects(pairs, 'Read')
+            # Locking the repositories, and writing every grant
+            assert len(statements) == 2
+
+    def test_grant_nonexistant(self, client, session, pairs):
+        with pytest.raises(NoResultFound):
+            client.grant_repositories_to_subjects(
+                [*pairs, (pairs[0][0], 'nonexistant')], 'Read'
+            )
+        assert 0 == session.query(Grant).count()
+
+    def test_grant_invalid_permission(self, client, pairs):
+        with pytest.raises(ValueError):
+            client.grant_repositories_to_subjects(pairs, 'Owner')
+
+    def test_revoke(self, client, session, pairs):
+        client.grant_repositories_to_subjects(pairs, 'Read')
+        assert sorted(pairs[:3]) == client.revoke_grants(
+            [*pairs[:3], ('nonexistant', 'nonexistant')]
+        )
+        assert set(pairs[3:]) == {
+            (grant.repository_uuid, grant.subject_uuid)
+            for grant in session.query(Grant)
+        }
+        assert [] == client.revoke_grants(pairs[:3])
+
+    def test_revoke_effective(self, client, session, db_users, pairs):
+        client.grant_repositories_to_subjects(pairs, 'Read')
+        client.revoke_grants(pairs)
+        assert 0 == session.query(EffectivePermission).count()
+
+    def test_concurrent(self, committed_engine):
+        session = Session(committed_engine)
+        users = UserFactory.create_batch(30)
+        repositories = RepositoryFactory.create_batch(30)
+        session.add_all([*users, *repositories])
+        session.commit()
+        pairs = [
+            (repository.uuid, user.uuid)
+            for repository in repositories
+            for user in users
+        ]
+        session.close()
+
+        errors = []
+
+        def work(seed):
+            random = Random(seed)
+            session = Session(committed_engine)
+            client = Client(session)
+            for i in range(20):
+                sample = random.sample(pairs, 20)
+                try:
+                    if i % 3 == 2:
+                        client.revoke_grants(sample)
+                    else:
+                        client.grant_repositories_to_subjects(
+                            sample, random.choice(Grant.permission_type)
+                        )
+                except DBAPIError as e:
+                    session.rollback()
+                    errors.append(e)
+            session.close()
+
+        threads = [Thread(target=work, args=(seed,)) for seed in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert [] == errors
+        session = Session(committed_engine)
+        assert {
+            'missing': [],
+            'unexpected': []
+        } == Client(session).check_effective_permissions()
+        session.close()
+
+    def test_concurrent_other_repository(self, committed_engine):
+        session = Session(committed_engine)
+        user = UserFactory()
+        repositories = RepositoryFactory.create_batch(2)
+        session.add_all([user, *repositories])
+        session.commit()
+        pairs = [(repository.uuid, user.uuid) for repository in repositories]
+        session.close()
+
+        holding = Session(committed_engine)
+        waiting = Session(committed_engine)
+        try:
+            with Client(holding).batch() as client:
+                client.grant_repositories_to_subjects(pairs[:1], 'Read')
+                # Only the repository being written is locked
+                waiting.execute("SET LOCAL lock_timeout = '1s'")
+                result = Client(waiting).grant_repositories_to_subjects(
+                    pairs[1:], 'Read'
+                )
+                assert [pairs[1]] == result['created']
+        finally:
+            holding.close()
+            waiting.close()
+
+
+class TestEffectivePermissions():
+
+    def effective(self, session):
+        return {
+            tuple(row) for row in session.query(
+                EffectivePermission.user_uuid,
+                EffectivePermission.repository_uuid,
+                EffectivePermission.permission
+            )
+        }
+
+    @pytest.mark.parametrize('fixture_name', ['user_granted_read_hierarchy',
+                                              'group_granted_read_hierarchy'])
+    def test_granted(self, session, fixture_name, request):
+        hierarchy = request.getfixturevalue(fixture_name)
+        assert {
+            (hierarchy['user_uuid'], hierarchy['repository_uuid'], 'Read')
+        } == self.effective(session)
+
+    def test_highest_permission(self, session, group_granted_read_hierarchy):
+        hierarchy = group_granted_read_hierarchy
+        session.add(GrantAdminFactory(subject=hierarchy['user'],
+                                      repository=hierarchy['repository']))
+        session.commit()
+        assert {
+            (hierarchy['user_uuid'], hierarchy['repository_uuid'], 'Admin')
+        } == self.effective(session)
+
+    def test_update_grant(self, client, session, user_granted_read_hierarchy):
+        hierarchy = user_granted_read_hierarchy
+        client.grant_repository_to_subject(hierarchy['repository_uuid'],
+                                           hierarchy['user_uuid'], 'Write')
+        assert {
+            (hierarchy['user_uuid'], hierarchy['repository_uuid'], 'Write')
+        } == self.effective(session)
+
+    def test_delete_grant(self, client, session, user_granted_read_hierarchy):
+        hierarchy = user_granted_read_hierarchy
+        client.delete_grant(hierarchy['user_uuid'],
+                            hierarchy['repository_uuid'])
+        assert set() == self.effective(session)
+
+    def test_create_membership(self, client, session, db_user,
+                               group_granted_read_hierarchy):
+        hierarchy = group_granted_read_hierarchy
+        client.create_membership(hierarchy['group_uuid'], db_user.uuid,
+                                 'Member')
+        assert {
+            (hierarchy['user_uuid'], hierarchy['repository_uuid'], 'Read'),
+            (db_user.uuid, hierarchy['repository_uuid'], 'Read')
+        } == self.effective(session)
+
+    def test_delete_membership(self, client, session,
+                               group_granted_read_hierarchy):
+        hierarchy = group_granted_read_hierarchy
+        client.delete_membership(hierarchy['group_uuid'],
+                                 hierarchy['user_uuid'])
+        assert set() == self.effective(session)
+
+    def test_move_membership(self, session, group_granted_read_hierarchy):
+        group = GroupFactory()
+        session.add(group)
+        session.commit()
+        session.query(Membership).update({'group_uuid': group.uuid})
+        session.commit()
+        assert set() == self.effective(session)
+
+    def test_bulk_memberships(self, client, session, db_users,
+                              group_granted_read_hierarchy):
+        hierarchy = group_granted_read_hierarchy
+        session.add_all([
+            MembershipFactory(group=hierarchy['group'], user=user)
+            for user in db_users
+        ])
+        session.commit()
+        assert {
+            (user_uuid, hierarchy['repository_uuid'], 'Read')
+            for user_uuid in [hierarchy['user_uuid'],
+                              *(user.uuid for user in db_users)]
+        } == self.effective(session)
+        assert {
+            'missing': [],
+            'unexpected': []
+        } == client.check_effective_permissions()
+
+    def test_delete_repository(self, client, session,
+                               group_granted_read_hierarchy):
+        client.delete_repository(
+            group_granted_read_hierarchy['repository_uuid']
+        )
+        assert set() == self.effective(session)
+
+    def test_create_existing_grants(self, connection, client, session,
+                                    group_granted_read_hierarchy):
+        hierarchy = group_granted_read_hierarchy
+        connection.execute('DROP TABLE t_effective_permission')
+        # Only the missing table is created, but all the triggers again
+        Base.metadata.create_all(connection)
+        assert client.has_permission(hierarchy['user_uuid'], 'Repository',
+                                     hierarchy['repository_uuid'], 'Read')
+        assert {
+            (hierarchy['user_uuid'], hierarchy['repository_uuid'], 'Read')
+        } == self.effective(session)
+
+    def test_create_all_again(self, connection, session,
+                              group_granted_read_hierarchy):
+        hierarchy = group_granted_read_hierarchy
+        Base.metadata.create_all(connection)
+        session.add(GrantAdminFactory(subject=hierarchy['user'],
+                                      repository=hierarchy['repository']))
+        session.commit()
+        assert {
+            (hierarchy['user_uuid'], hierarchy['repository_uuid'], 'Admin')
+        } == self.effective(session)
+
+    def test_check(self, client, many_user_granted_repository):
+        assert {
+            'missing': [],
+            'unexpected': []
+        } == client.check_effective_permissions()
+
+    def test_check_and_rebuild(self, client, session,
+                               user_granted_read_hierarchy):
+        hierarchy = user_granted_read_hierarchy
+        session.query(EffectivePermission).update({'permission': 'Admin'})
+        assert {
+            'missing': [{
+                'user_uuid': hierarchy['user_uuid'],
+                'repository_uuid': hierarchy['repository_uuid'],
+                'permission': 'Read'
+            }],
+            'unexpected': [{
+                'user_uuid': hierarchy['user_uuid'],
+                'repository_uuid': hierarchy['repository_uuid'],
+                'permission': 'Admin'
+            }]
+        } == client.check_effective_permissions()
+        client.rebuild_effective_permissions()
+        assert {
+            'missing': [],
+            'unexpected': []
+        } == client.check_effective_permissions()
+
+    def test_has_permission_query_count(self, connection, client,
+                                        group_granted_read_hierarchy):
+        hierarchy = group_granted_read_hierarchy
+        with statement_log(connection) as statements:
+            assert client.has_permission(hierarchy['user_uuid'], 'Image',
+                                         hierarchy['image_uuid'])
+            assert len(statements) == 1
+
+
+class TestPublic():
+
+    @pytest.fixture
+    def public_hierarchy(self, session, user_granted_read_hierarchy):
+        user_granted_read_hierarchy['repository'].access = 'PublicRead'
+        session.commit()
+        return user_granted_read_hierarchy
+
+    @pytest.mark.parametrize('resource_type', ['Repository', 'Import',
+                                               'Fileset', 'Image'])
+    def test_anonymous(self, client, public_hierarchy, resource_type):
+        key = resource_type.lower()
+        resource_uuid = public_hierarchy[f'{key}_uuid']
+        assert client.has_permission(None, resource_type, resource_uuid,
+                                     'Read')
+        assert not client.has_permission(None, resource_type, resource_uuid,
+                                         'Write')
+
+    def test_anonymous_private(self, client, user_granted_read_hierarchy):
+        assert not client.has_permission(
+            None, 'Image', user_granted_read_hierarchy['image_uuid'], 'Read'
+        )
+
+    def test_other_user(self, client, db_user, public_hierarchy):
+        assert client.has_permission(db_user.uuid, 'Image',
+                                     public_hierarchy['image_uuid'], 'Read')
+
+    @pytest.mark.parametrize('permission,decision', [('Read', True),
+                                                     ('Write', True),
+                                                     ('Admin', False)])
+    def test_public_write(self, client, session, public_hierarchy,
+                          permission, decision):
+        public_hierarchy['repository'].access = 'PublicWrite'
+        session.commit()
+        assert decision is client.has_permission(
+            None, 'Repository', public_hierarchy['repository_uuid'],
+            permission
+        )
+
+    def test_has_permissions(self, client, miniclient, public_hierarchy,
+                             db_image):
+        targets = [
+            ('Image', public_hierarchy['image_uuid'], 'Read'),
+            ('Image', public_hierarchy['image_uuid'], 'Write'),
+            ('Image', db_image.uuid, 'Read')
+        ]
+        expected = {
+            targets[0]: True,
+            targets[1]: False,
+            targets[2]: False
+        }
+        assert expected == client.has_permissions(None, targets)
+        assert expected == miniclient.has_permissions(None, targets)
+
+    def test_image_permission(self, miniclient, public_hierarchy):
+        assert miniclient.has_image_permission(
+            None, public_hierarchy['image_uuid']
+        )
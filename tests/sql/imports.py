@@ -0,0 +1,39 @@
+import os
+import subprocess
+import sys
+
+SRC = os.path.join(os.path.dirname(__file__), '..', '..', 'src')
+
+
+def imported_modules(statement, modules):
+    '''Which of some modules are imported by a statement in a fresh
+    interpreter.
+    '''
+
+    code = (f'import sys; {statement}; '
+            f'print(*[m for m in {modules!r} if m in sys.modules])')
+    output = subprocess.run([sys.executable, '-c', code],
+                            stdout=subprocess.PIPE, check=True,
+                            universal_newlines=True, cwd=SRC).stdout
+    return output.split()
+
+
+class TestImports():
+
+    def test_api(self):
+        assert [] == imported_modules('import minerva_db.sql.api',
+                                      ['minerva_db.sql.api.client',
+                                       'minerva_db.sql.models'])
+
+    def test_client(self):
+        assert [] == imported_modules(
+            'from minerva_db.sql.api import Client',
+            ['marshmallow', 'minerva_db.sql.serializers.image']
+        )
+
+    def test_serializer(self):
+        assert ['minerva_db.sql.serializers.image'] == imported_modules(
+            'from minerva_db.sql.serializers import image_schema',
+            ['minerva_db.sql.serializers.image',
+             'minerva_db.sql.serializers.key']
+        )
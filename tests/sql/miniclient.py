@@ -0,0 +1,139 @@
+import os
+import subprocess
+import sys
+import pytest
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm.exc import NoResultFound
+from src.minerva_db.sql.miniclient.prepared import PreparedStatement
+from src.minerva_db.sql.models.renderingsettings import Channel
+from . import statement_log
+
+SRC = os.path.join(os.path.dirname(__file__), '..', '..', 'src')
+
+
+@pytest.fixture
+def channels():
+    return [
+        Channel('1', 'DNA', '0000FF', 0.2, 0.5).as_dict(),
+        Channel('2', 'CD4', '00FF00', 0, 1).as_dict()
+    ]
+
+
+@pytest.fixture
+def channel_group(client, channels, user_granted_read_hierarchy):
+    client.create_rendering_settings('channel_group1',
+                                     user_granted_read_hierarchy['image_uuid'],
+                                     channels, 'Macrophages')
+    return 'channel_group1'
+
+
+class TestAuthorizedImageChannelGroup():
+
+    def test_granted(self, connection, miniclient, channels, channel_group,
+                     user_granted_read_hierarchy):
+        user_uuid = user_granted_read_hierarchy['user_uuid']
+        image_uuid = user_granted_read_hierarchy['image_uuid']
+        with statement_log(connection) as statements:
+            image = miniclient.get_authorized_image_channel_group(
+                user_uuid, image_uuid, channel_group
+            )
+            assert len(statements) == 1
+        assert {
+            'pyramid_levels': 1,
+            'tile_size': 1024,
+            'format': 'tiff',
+            'compression': 'zlib',
+            'pixel_type': 'uint16',
+            'rgb': False,
+            'channels': channels
+        } == image
+
+    def test_denied(self, miniclient, channel_group,
+                    user_granted_read_hierarchy):
+        user_uuid = user_granted_read_hierarchy['user_uuid']
+        image_uuid = user_granted_read_hierarchy['image_uuid']
+        assert miniclient.get_authorized_image_channel_group(
+            user_uuid, image_uuid, channel_group, 'Write'
+        ) is None
+        assert miniclient.get_authorized_image_channel_group(
+            None, image_uuid, channel_group
+        ) is None
+
+    def test_public(self, session, miniclient, channel_group,
+                    user_granted_read_hierarchy):
+        user_granted_read_hierarchy['repository'].access = 'PublicRead'
+        session.commit()
+        image = miniclient.get_authorized_image_channel_group(
+            None, user_granted_read_hierarchy['image_uuid'], channel_group
+        )
+        assert image is not None
+
+    def test_missing_channel_group(self, miniclient,
+                                   user_granted_read_hierarchy):
+        image = miniclient.get_authorized_image_channel_group(
+            user_granted_read_hierarchy['user_uuid'],
+            user_granted_read_hierarchy['image_uuid'],
+            'missing'
+        )
+        assert image['channels'] is None
+
+    def test_missing_image(self, miniclient, user_granted_read_hierarchy):
+        assert miniclient.get_authorized_image_channel_group(
+            user_granted_read_hierarchy['user_uuid'], 'missing', 'missing'
+        ) is None
+
+    def test_matches_has_image_permission(self, miniclient, channel_group,
+                                          group_granted_read_hierarchy):
+        user_uuid = group_granted_read_hierarchy['user_uuid']
+        image_uuid = group_granted_read_hierarchy['image_uuid']
+        for permission in ('Read', 'Write', 'Admin'):
+            decision = miniclient.has_image_permission(user_uuid, image_uuid,
+                                                       permission)
+            image = miniclient.get_authorized_image_channel_group(
+                user_uuid, image_uuid, channel_group, permission
+            )
+            assert decision is (image is not None)
+
+
+class TestMiniClient():
+
+    def test_does_not_import_models(self):
+        code = ('import sys; '
+                'import minerva_db.sql.miniclient.miniclient; '
+                'print("minerva_db.sql.models" in sys.modules)')
+        output = subprocess.run([sys.executable, '-c', code],
+                                stdout=subprocess.PIPE, check=True,
+                                cwd=SRC).stdout
+        assert b'False' == output.strip()
+
+    def test_get_image_channel_group(self, miniclient, channels,
+                                     channel_group):
+        rendering_settings = miniclient.get_image_channel_group(channel_group)
+        assert 'Macrophages' == rendering_settings.label
+        assert channels == rendering_settings.channels
+
+    def test_get_image_channel_group_missing(self, miniclient):
+        with pytest.raises(NoResultFound):
+            miniclient.get_image_channel_group('missing')
+
+
+class TestPreparedStatement():
+
+    @pytest.fixture
+    def statement(self, request):
+        return PreparedStatement(f'test_{request.node.name}', ['value'],
+                                 'SELECT CAST($1 AS INTEGER) + 1 AS value')
+
+    def test_prepared_once(self, connection, statement):
+        assert 2 == statement.execute(connection, value='1').scalar()
+        with statement_log(connection) as statements:
+            assert 3 == statement.execute(connection, value='2').scalar()
+            assert 1 == len(statements)
+            assert str(statements[0]).startswith('EXECUTE')
+
+    def test_recovers_after_error(self, connection, statement):
+        transaction = connection.begin_nested()
+        with pytest.raises(DBAPIError):
+            statement.execute(connection, value='invalid')
+        transaction.rollback()
+        assert 2 == statement.execute(connection, value='1').scalar()
@@ -0,0 +1,268 @@
+import re
+import pytest
+from sqlalchemy.orm import Session
+from src.minerva_db.sql.api import Client
+from src.minerva_db.sql.models import RenderingSettings
+from . import query_plans
+from .factories import FilesetFactory, ImportFactory, RepositoryFactory
+
+# Tables which grow with the data, so must never be scanned sequentially
+LARGE_TABLES = {'t_membership', 't_grant', 't_effective_permission',
+                't_import', 't_fileset', 't_key', 't_image',
+                't_rendering_settings'}
+
+CALLS = {
+    'get_group': lambda c, h: c.get_group(h['group_uuid']),
+    'get_membership': lambda c, h: c.get_membership(h['group_uuid'],
+                                                    h['user_uuid']),
+    'is_member': lambda c, h: c.is_member(h['group_uuid'], h['user_uuid']),
+    'is_owner': lambda c, h: c.is_owner(h['group_uuid'], h['user_uuid']),
+    'get_image': lambda c, h: c.get_image(h['image_uuid']),
+    'get_image_as_json': lambda c, h: c.get_image(h['image_uuid'],
+                                                  as_json=True),
+    'get_import': lambda c, h: c.get_import(h['import_uuid']),
+    'get_fileset': lambda c, h: c.get_fileset(h['fileset_uuid']),
+    'get_repository': lambda c, h: c.get_repository(h['repository_uuid']),
+    'has_permission': lambda c, h: c.has_permission(
+        h['user_uuid'], 'Image', h['image_uuid'], 'Read'
+    ),
+    'has_permissions': lambda c, h: c.has_permissions(h['user_uuid'], [
+        ('Repository', h['repository_uuid'], 'Read'),
+        ('Import', h['import_uuid'], 'Read'),
+        ('Fileset', h['fileset_uuid'], 'Read'),
+        ('Image', h['image_uuid'], 'Read')
+    ]),
+    'list_repositories_for_user': lambda c, h: c.list_repositories_for_user(
+        h['user_uuid'], implied=True
+    ),
+    'list_repositories_for_user_as_json':
+        lambda c, h: c.list_repositories_for_user(h['user_uuid'],
+                                                  as_json=True),
+    'list_grants_for_repository': lambda c, h: c.list_grants_for_repository(
+        h['repository_uuid']
+    ),
+    'list_grants_for_repository_as_json':
+        lambda c, h: c.list_grants_for_repository(h['repository_uuid'],
+                                                  as_json=True),
+    'list_imports_in_repository': lambda c, h: c.list_imports_in_repository(
+        h['repository_uuid']
+    ),
+    'list_filesets_in_import': lambda c, h: c.list_filesets_in_import(
+        h['import_uuid']
+    ),
+    'list_keys_in_import': lambda c, h: c.list_keys_in_import(
+        h['import_uuid'], limit=10
+    ),
+    'list_keys_in_fileset': lambda c, h: c.list_keys_in_fileset(
+        h['fileset_uuid'], limit=10
+    ),
+    'list_images_in_fileset': lambda c, h: c.list_images_in_fileset(
+        h['fileset_uuid']
+    ),
+    'list_images_in_repository': lambda c, h: c.list_images_in_repository(
+        h['repository_uuid']
+    ),
+    'list_rendering_settings': lambda c, h: c.list_rendering_settings(
+        h['image_uuid']
+    ),
+    'delete_images_in_fileset': lambda c, h: c.delete_images_in_fileset(
+        h['fileset_uuid']
+    ),
+    'purge_deleted_images': lambda c, h: list(c.purge_deleted_images()),
+    'delete_repository': lambda c, h: c.delete_repository(
+        h['repository_uuid']
+    )
+}
+# The MiniClient's prepared statements are explained when executed by name, so
+# each call is made twice, the first preparing them
+MINICLIENT_CALLS = {
+    'has_image_permission': lambda m, h: m.has_image_permission(
+        h['user_uuid'], h['image_uuid']
+    ),
+    'has_permissions': lambda m, h: m.has_permissions(h['user_uuid'], [
+        ('Repository', h['repository_uuid'], 'Read'),
+        ('Import', h['import_uuid'], 'Read'),
+        ('Fileset', h['fileset_uuid'], 'Read'),
+        ('Image', h['image_uuid'], 'Read')
+    ]),
+    'get_image_channel_group': lambda m, h: m.get_image_channel_group(
+        h['rendering_settings_uuid']
+    ),
+    'get_authorized_image_channel_group':
+        lambda m, h: m.get_authorized_image_channel_group(
+            h['user_uuid'], h['image_uuid'], h['rendering_settings_uuid']
+        )
+}
+
+# Statements run inside the database, by the effective permission triggers
+# and by ON DELETE CASCADE, which query_plans cannot see
+INTERNAL_STATEMENTS = {
+    'refresh_effective_permission_repository': (
+        'DELETE FROM t_effective_permission WHERE repository_uuid = %s',
+        'repository_uuid'
+    ),
+    'refresh_effective_permission_user': (
+        'DELETE FROM t_effective_permission WHERE user_uuid = %s',
+        'user_uuid'
+    ),
+    'cascade_repository_grants': (
+        'DELETE FROM t_grant WHERE repository_uuid = %s',
+        'repository_uuid'
+    ),
+    'cascade_repository_imports': (
+        'DELETE FROM t_import WHERE repository_uuid = %s',
+        'repository_uuid'
+    ),
+    'cascade_import_filesets': (
+        'DELETE FROM t_fileset WHERE import_uuid = %s',
+        'import_uuid'
+    ),
+    'cascade_repository_images': (
+        'DELETE FROM t_image WHERE repository_uuid = %s',
+        'repository_uuid'
+    ),
+    'cascade_import_keys': (
+        'DELETE FROM t_key WHERE import_uuid = %s',
+        'import_uuid'
+    ),
+    'cascade_fileset_images': (
+        'DELETE FROM t_image WHERE fileset_uuid = %s',
+        'fileset_uuid'
+    ),
+    'cascade_fileset_keys': (
+        'UPDATE t_key SET fileset_uuid = NULL WHERE fileset_uuid = %s',
+        'fileset_uuid'
+    ),
+    'cascade_image_rendering_settings': (
+        'DELETE FROM t_rendering_settings WHERE image_uuid = %s',
+        'image_uuid'
+    )
+}
+
+
+def unbounded_scans(connection, plan):
+    '''Tables scanned in full by a plan.
+
+    A scan is in full if it is sequential, or of an index without a
+    condition on its leading column, unless the index is partial.
+    '''
+
+    lines = plan.splitlines()
+    tables = set()
+    for i, line in enumerate(lines):
+        match = re.search(r'Seq Scan on (\w+)', line)
+        if match:
+            tables.add(match.group(1))
+            continue
+
+        match = re.search(r'Index (?:Only )?Scan (?:using|on) (\w+)', line)
+        if not match:
+            continue
+
+        table, column, partial = connection.execute('''
+            SELECT t.relname, a.attname, i.indpred IS NOT NULL
+            FROM pg_index AS i
+            JOIN pg_class AS c ON c.oid = i.indexrelid
+            JOIN pg_class AS t ON t.oid = i.indrelid
+            JOIN pg_attribute AS a ON a.attrelid = i.indrelid
+                AND a.attnum = i.indkey[0]
+            WHERE c.relname = %s
+        ''', match.group(1)).first()
+
+        # The details of a node precede the next node
+        details = []
+        for detail in lines[i + 1:]:
+            if '->' in detail:
+                break
+            details.append(detail)
+        conditions = [detail for detail in details if 'Index Cond' in detail]
+        if not partial and not any(re.search(rf'\b{column}\b', condition)
+                                   for condition in conditions):
+            tables.add(table)
+
+    return tables
+
+
+class TestQueryPlans():
+    '''Only statements sent by the Client and the MiniClient are explained by
+    query_plans. Those run inside the database, by triggers and foreign key
+    cascades, are explained separately from INTERNAL_STATEMENTS, which must
+    be kept in step with them.
+    '''
+
+    @pytest.fixture
+    def hierarchy(self, session, group_granted_read_hierarchy):
+        hierarchy = group_granted_read_hierarchy
+        rendering_settings = RenderingSettings('plans-rendering-settings',
+                                               hierarchy['image'], [])
+        session.add(rendering_settings)
+        session.commit()
+        hierarchy['rendering_settings_uuid'] = rendering_settings.uuid
+        return hierarchy
+
+    def plans(self, connection, call):
+        # Sequential scans are avoided whenever there is an index to use, so
+        # those remaining are of tables without a suitable index
+        connection.execute('SET LOCAL enable_seqscan = off')
+        try:
+            with query_plans(connection) as plans:
+                call()
+        finally:
+            connection.execute('SET LOCAL enable_seqscan = on')
+        return plans
+
+    def assert_no_full_scans(self, connection, plans):
+        assert len(plans) > 0
+        scanned = {table for plan in plans
+                   for table in unbounded_scans(connection, plan)}
+        assert set() == scanned & LARGE_TABLES
+
+    @pytest.mark.parametrize('name', sorted(CALLS))
+    def test_no_full_scans(self, connection, client, name, hierarchy):
+        plans = self.plans(connection, lambda: CALLS[name](client, hierarchy))
+        self.assert_no_full_scans(connection, plans)
+
+    @pytest.mark.parametrize('name', sorted(MINICLIENT_CALLS))
+    def test_no_full_scans_miniclient(self, connection, miniclient, name,
+                                      hierarchy):
+        MINICLIENT_CALLS[name](miniclient, hierarchy)
+        plans = self.plans(
+            connection, lambda: MINICLIENT_CALLS[name](miniclient, hierarchy)
+        )
+        self.assert_no_full_scans(connection, plans)
+
+    @pytest.mark.parametrize('name', sorted(INTERNAL_STATEMENTS))
+    def test_no_full_scans_internal(self, connection, name,
+                                    group_granted_read_hierarchy):
+        statement, key = INTERNAL_STATEMENTS[name]
+        connection.execute('SET LOCAL enable_seqscan = off')
+        try:
+            plan = '\n'.join(row[0] for row in connection.execute(
+                f'EXPLAIN {statement}', group_granted_read_hierarchy[key]
+            ))
+        finally:
+            connection.execute('SET LOCAL enable_seqscan = on')
+
+        assert set() == unbounded_scans(connection, plan) & LARGE_TABLES
+
+    def test_list_incomplete_imports(self, committed_engine):
+        # Which plan is cheapest depends on how few filesets are incomplete,
+        # so this is planned with the statistics of representative data
+        # rather than the defaults for tables which were never analyzed
+        session = Session(committed_engine)
+        try:
+            repository = RepositoryFactory()
+            session.add_all([
+                FilesetFactory(import_=ImportFactory(repository=repository),
+                               complete=i > 0)
+                for i in range(500)
+            ])
+            session.commit()
+            connection = session.connection()
+            connection.execute('ANALYZE t_import, t_fileset')
+
+            client = Client(session)
+            plans = self.plans(connection, client.list_incomplete_imports)
+            self.assert_no_full_scans(connection, plans)
+        finally:
+            session.close()
@@ -0,0 +1,52 @@
+from src.minerva_db.sql.api.progress import ProgressCoalescer
+from src.minerva_db.sql.models import Fileset
+
+
+class Clock():
+
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+class TestProgressCoalescer():
+
+    def progress(self, session):
+        session.expire_all()
+        return session.query(Fileset.progress).scalar()
+
+    def test_coalesced(self, client, session, db_fileset):
+        clock = Clock()
+        writes = []
+        set_fileset_progress = client.set_fileset_progress
+        client.set_fileset_progress = lambda *args: (
+            writes.append(args), set_fileset_progress(*args)
+        )
+        coalescer = ProgressCoalescer(client, interval=1, clock=clock)
+
+        coalescer.update(db_fileset.uuid, 10)
+        coalescer.update(db_fileset.uuid, 30)
+        coalescer.update(db_fileset.uuid, 20)
+        assert 10 == self.progress(session)
+
+        clock.now = 1
+        coalescer.update(db_fileset.uuid, 25)
+        assert 30 == self.progress(session)
+        assert [(db_fileset.uuid, 10), (db_fileset.uuid, 30)] == writes
+
+    def test_flushed_on_exit(self, client, session, db_fileset):
+        with ProgressCoalescer(client, clock=Clock()) as coalescer:
+            coalescer.update(db_fileset.uuid, 10)
+            coalescer.update(db_fileset.uuid, 40)
+        assert 40 == self.progress(session)
+
+    def test_nonexistant_discarded(self, client, session, db_fileset):
+        coalescer = ProgressCoalescer(client, clock=Clock())
+        coalescer.update('nonexistant', 50)
+        coalescer.update('nonexistant', 60)
+        coalescer.update(db_fileset.uuid, 40)
+        coalescer.flush()
+        assert {} == coalescer._pending
+        assert 40 == self.progress(session)
@@ -1,4 +1,6 @@
 import pytest
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql
 from sqlalchemy.exc import IntegrityError, DataError
 from sqlalchemy.orm.exc import NoResultFound
 from src.minerva_db.sql.api import DBError
@@ -7,7 +9,8 @@ from src.minerva_db.sql.models import (Repository, Import, Fileset, Image, Key,
                                        User, Grant, RenderingSettings, Channel)
 from .factories import (RepositoryFactory, ImportFactory, FilesetFactory,
                         ImageFactory, KeyFactory)
-from . import sa_obj_to_dict, statement_log
+from . import sa_obj_to_dict, statement_log, query_plans
+import json
 import uuid
 
 
@@ -96,6 +99,30 @@ class TestRepository:
         assert 0 == session.query(Grant).count()
         assert 1 == session.query(User).count()
 
+    def test_delete_repository_query_count(self, connection, client,
+                                           user_granted_read_hierarchy):
+        repository_uuid = user_granted_read_hierarchy['repository_uuid']
+        client.create_rendering_settings(
+            'rendering_settings1', user_granted_read_hierarchy['image_uuid'],
+            [], 'label'
+        )
+        with statement_log(connection) as statements:
+            client.delete_repository(repository_uuid)
+            assert len(statements) == 1
+
+    def test_delete_repository_nonexistant(self, client):
+        with pytest.raises(NoResultFound):
+            client.delete_repository('nonexistant')
+
+    def test_delete_fileset_keys_kept(self, session,
+                                      user_granted_read_hierarchy):
+        fileset_uuid = user_granted_read_hierarchy['fileset_uuid']
+        session.query(Fileset) \
+            .filter(Fileset.uuid == fileset_uuid) \
+            .delete(synchronize_session=False)
+        assert [None] == [uuid for uuid, in session.query(Key.fileset_uuid)]
+        assert 0 == session.query(Image).count()
+
 
 class TestImport():
 
@@ -163,6 +190,44 @@ class TestImport():
             client.list_imports_in_repository(repository_uuid)
             assert len(statements) == 1
 
+    def test_add_keys_to_import(self, client, session, db_import):
+        keys = (f'key{i}' for i in range(25))
+        assert 25 == client.add_keys_to_import(keys, db_import.uuid,
+                                               batch_size=10)
+        assert {f'key{i}' for i in range(25)} == {
+            key for key, in session.query(Key.key).filter(
+                Key.import_uuid == db_import.uuid
+            )
+        }
+
+    def test_add_keys_to_import_progress(self, client, db_import):
+        progress = []
+        client.add_keys_to_import([f'key{i}' for i in range(25)],
+                                  db_import.uuid, batch_size=10,
+                                  progress=lambda n, rate: progress.append(n))
+        assert [10, 20, 25] == progress
+
+    def test_add_keys_to_import_duplicate(self, client, db_import):
+        client.add_keys_to_import(['key0'], db_import.uuid)
+        with pytest.raises(IntegrityError):
+            client.add_keys_to_import(['key0', 'key1'], db_import.uuid)
+
+    def test_add_keys_to_import_skip_existing(self, client, session,
+                                              db_import):
+        client.add_keys_to_import([f'key{i}' for i in range(10)],
+                                  db_import.uuid)
+        assert 5 == client.add_keys_to_import(
+            [f'key{i}' for i in range(5, 15)], db_import.uuid,
+            skip_existing=True
+        )
+        assert 15 == session.query(Key) \
+            .filter(Key.import_uuid == db_import.uuid) \
+            .count()
+
+    def test_add_keys_to_import_nonexistant_import(self, client):
+        with pytest.raises(NoResultFound):
+            client.add_keys_to_import(['key0'], 'nonexistant')
+
     # TODO Test class for Key?
     def test_list_keys_in_import(self, client,
                                  user_granted_read_hierarchy):
@@ -179,6 +244,13 @@ class TestImport():
             client.list_keys_in_import(import_uuid)
             assert len(statements) == 1
 
+    def test_list_keys_in_import_loads_no_objects(self, session, client,
+                                                  user_granted_read_hierarchy):
+        import_uuid = user_granted_read_hierarchy['import_uuid']
+        session.expunge_all()
+        client.list_keys_in_import(import_uuid)
+        assert 0 == len(session.identity_map)
+
     def test_update_import_name(self, client, db_import):
         keys = ('uuid', 'name', 'complete', 'repository_uuid')
         d = sa_obj_to_dict(db_import, keys)
@@ -244,6 +316,70 @@ class TestFileset():
             client.create_fileset(import_uuid=db_import_with_keys.uuid,
                                   keys=db_keys, **d2)
 
+    def test_create_fileset_duplicate_key_rolled_back(self, client, session,
+                                                      db_import_with_keys):
+        db_keys = [key.key for key in db_import_with_keys.keys[:2]]
+        keys = ('uuid', 'name', 'reader', 'reader_software', 'reader_version')
+        d1 = sa_obj_to_dict(FilesetFactory(), keys)
+        d2 = sa_obj_to_dict(FilesetFactory(), keys)
+        client.create_fileset(import_uuid=db_import_with_keys.uuid,
+                              keys=db_keys[:1], **d1)
+        with pytest.raises(DBError):
+            client.create_fileset(import_uuid=db_import_with_keys.uuid,
+                                  keys=db_keys, **d2)
+        assert [d1['uuid']] == [uuid for uuid, in session.query(Fileset.uuid)]
+        assert 1 == session.query(Key) \
+            .filter(Key.fileset_uuid.isnot(None)) \
+            .count()
+
+    def test_create_fileset_missing_keys(self, client, session,
+                                         db_import_with_keys):
+        db_key = db_import_with_keys.keys[0].key
+        keys = ('uuid', 'name', 'reader', 'reader_software', 'reader_version')
+        d = sa_obj_to_dict(FilesetFactory(), keys)
+        client.create_fileset(import_uuid=db_import_with_keys.uuid,
+                              keys=[db_key, 'nonexistant'], **d)
+        fileset = session.query(Fileset).one()
+        assert [db_key] == [key.key for key in fileset.keys]
+
+    def test_create_fileset_key_pattern(self, client, session, db_import):
+        session.add_all([Key(key, db_import) for key in
+                         ('a/1.tif', 'a/2.tif', 'a/metadata.xml', 'b/1.tif')])
+        session.commit()
+        keys = ('uuid', 'name', 'reader', 'reader_software', 'reader_version')
+        d = sa_obj_to_dict(FilesetFactory(), keys)
+        client.create_fileset(import_uuid=db_import.uuid,
+                              keys=['a/metadata.xml'], key_pattern='a/%.tif',
+                              **d)
+        fileset = session.query(Fileset).one()
+        assert {'a/1.tif', 'a/2.tif', 'a/metadata.xml'} == {
+            key.key for key in fileset.keys
+        }
+
+    def test_create_fileset_key_pattern_duplicate_key(self, client,
+                                                      db_import_with_keys):
+        db_keys = [db_import_with_keys.keys[0].key]
+        keys = ('uuid', 'name', 'reader', 'reader_software', 'reader_version')
+        d1 = sa_obj_to_dict(FilesetFactory(), keys)
+        d2 = sa_obj_to_dict(FilesetFactory(), keys)
+        client.create_fileset(import_uuid=db_import_with_keys.uuid,
+                              keys=db_keys, **d1)
+        with pytest.raises(DBError):
+            client.create_fileset(import_uuid=db_import_with_keys.uuid,
+                                  keys=[], key_pattern='key%', **d2)
+
+    def test_create_fileset_query_count(self, connection, client,
+                                        db_import_with_keys):
+        import_uuid = db_import_with_keys.uuid
+        db_keys = [key.key for key in db_import_with_keys.keys]
+        keys = ('uuid', 'name', 'reader', 'reader_software', 'reader_version')
+        d = sa_obj_to_dict(FilesetFactory(), keys)
+        with statement_log(connection) as statements:
+            client.create_fileset(import_uuid=import_uuid, keys=db_keys, **d)
+            updates = [str(statement) for statement in statements
+                       if str(statement).startswith('UPDATE')]
+            assert 1 == len(updates)
+
     def test_create_fileset_nonexistant_import(self, client, session):
         keys = ('uuid', 'name', 'reader', 'reader_software', 'reader_version')
         d = sa_obj_to_dict(FilesetFactory(), keys)
@@ -339,12 +475,415 @@ class TestFileset():
         d_image['repository_uuid'] = db_fileset.import_.repository_uuid
         assert to_jsonapi([d_image]) == image
 
+    def test_update_fileset_keeps_progress(self, client, session,
+                                           db_fileset):
+        client.update_fileset(db_fileset.uuid, progress=50)
+        client.update_fileset(db_fileset.uuid, name='renamed')
+        assert 50 == session.query(Fileset.progress).scalar()
+
+    def test_set_fileset_progress(self, client, session, db_fileset):
+        client.set_fileset_progress(db_fileset.uuid, 60)
+        assert 60 == session.query(Fileset.progress).scalar()
+        client.set_fileset_progress(db_fileset.uuid, 40)
+        assert 60 == session.query(Fileset.progress).scalar()
+
+    def test_set_fileset_progress_query_count(self, connection, client,
+                                              db_fileset):
+        fileset_uuid = db_fileset.uuid
+        with statement_log(connection) as statements:
+            client.set_fileset_progress(fileset_uuid, 60)
+            assert len(statements) == 1
+
+    def test_set_fileset_progress_nonexistant(self, client):
+        with pytest.raises(NoResultFound):
+            client.set_fileset_progress('nonexistant', 60)
+
     def test_update_fileset_incomplete_with_images(self, client, db_fileset):
         d_image = sa_obj_to_dict(ImageFactory(), ['uuid', 'name',
                                                   'pyramid_levels'])
         with pytest.raises(DBError):
             client.update_fileset(db_fileset.uuid, images=[d_image])
 
+    def test_add_images_to_fileset(self, client, db_fileset):
+        db_fileset.complete = True
+        images = [
+            {'uuid': f'image{i}', 'name': f'image{i}', 'pyramid_levels': 1,
+             'tile_size': 1024, 'format': 'tiff', 'compression': 'zlib'}
+            for i in range(3)
+        ]
+        assert ['image0', 'image1', 'image2'] == client.add_images_to_fileset(
+            db_fileset.uuid, images
+        )
+        d_images = [{
+            **image,
+            'deleted': False,
+            'rgb': False,
+            'pixel_type': 'uint16',
+            'fileset_uuid': db_fileset.uuid,
+            'repository_uuid': db_fileset.import_.repository_uuid
+        } for image in images]
+        assert to_jsonapi(d_images) == client.list_images_in_fileset(
+            db_fileset.uuid
+        )
+        assert to_jsonapi(d_images[0], {
+            'rendering_settings': []
+        }) == client.get_image('image0')
+
+    def test_add_images_to_fileset_rendering_settings(self, client, session,
+                                                      db_fileset):
+        db_fileset.complete = True
+        channels = [Channel('1', 'DNA', '0000FF', 0, 1).as_dict()]
+        images = [
+            {'uuid': f'image{i}', 'name': f'image{i}', 'pyramid_levels': 1,
+             'tile_size': 1024}
+            for i in range(3)
+        ]
+        client.add_images_to_fileset(db_fileset.uuid, images, {
+            'channels': channels,
+            'label': 'Default'
+        })
+        rendering_settings = session.query(RenderingSettings).all()
+        assert ['image0', 'image1', 'image2'] == sorted(
+            settings.image_uuid for settings in rendering_settings
+        )
+        assert all(settings.channels == channels and
+                   settings.label == 'Default'
+                   for settings in rendering_settings)
+
+    def test_add_images_to_fileset_invalid(self, client, db_fileset):
+        db_fileset.complete = True
+        with pytest.raises(ValueError):
+            client.add_images_to_fileset(db_fileset.uuid, [
+                {'uuid': 'image0', 'name': 'image0', 'pyramid_levels': 1}
+            ])
+
+    def test_add_images_to_incomplete_fileset(self, client, db_fileset):
+        with pytest.raises(DBError):
+            client.add_images_to_fileset(db_fileset.uuid, [
+                {'uuid': 'image0', 'name': 'image0', 'pyramid_levels': 1,
+                 'tile_size': 1024}
+            ])
+
+    def test_add_images_to_fileset_nonexistant(self, client):
+        with pytest.raises(NoResultFound):
+            client.add_images_to_fileset('nonexistant', [])
+
+
+class TestBatch():
+
+    @pytest.fixture
+    def commits(self, session):
+        commits = []
+
+        # Savepoints are also reported as commits
+        def listener(session):
+            if not session.transaction.nested:
+                commits.append(session)
+
+        event.listen(session, 'after_commit', listener)
+        yield commits
+        event.remove(session, 'after_commit', listener)
+
+    def workflow(self, client, repository_uuid, suffix=''):
+        client.create_import(f'import{suffix}', f'import{suffix}',
+                             repository_uuid)
+        client.add_keys_to_import(['key0', 'key1'], f'import{suffix}')
+        client.create_fileset(f'fileset{suffix}', f'fileset{suffix}',
+                              'reader', 'BioFormats', '1.0.0',
+                              ['key0', 'key1'], f'import{suffix}')
+        client.update_fileset(f'fileset{suffix}', complete=True)
+        client.add_images_to_fileset(f'fileset{suffix}', [{
+            'uuid': f'image{suffix}', 'name': f'image{suffix}',
+            'pyramid_levels': 1, 'tile_size': 1024
+        }])
+
+    def test_unbatched(self, client, db_repository, commits):
+        self.workflow(client, db_repository.uuid)
+        assert 5 == len(commits)
+
+    def test_batch(self, client, session, db_repository, commits):
+        with client.batch():
+            self.workflow(client, db_repository.uuid)
+            assert 0 == len(commits)
+        assert 1 == len(commits)
+        fileset = session.query(Fileset).one()
+        assert {'key0', 'key1'} == {key.key for key in fileset.keys}
+        assert ['image'] == [image.uuid for image in fileset.images]
+
+    def test_batch_error(self, client, session, db_repository, commits):
+        with pytest.raises(DBError):
+            with client.batch():
+                self.workflow(client, db_repository.uuid)
+                client.create_fileset('fileset2', 'fileset2', 'reader',
+                                      'BioFormats', '1.0.0', ['key0'],
+                                      'import')
+        assert 0 == len(commits)
+        assert 0 == session.query(Import).count()
+        assert 0 == session.query(Image).count()
+
+    def test_nested_batch_error(self, client, session, db_repository,
+                                commits):
+        with client.batch():
+            self.workflow(client, db_repository.uuid)
+            with pytest.raises(IntegrityError):
+                with client.batch():
+                    self.workflow(client, db_repository.uuid, suffix='2')
+                    client.add_keys_to_import(['key0'], 'import')
+            self.workflow(client, db_repository.uuid, suffix='3')
+        assert 1 == len(commits)
+        assert ['fileset', 'fileset3'] == sorted(
+            uuid for uuid, in session.query(Fileset.uuid)
+        )
+        assert ['image', 'image3'] == sorted(
+            uuid for uuid, in session.query(Image.uuid)
+        )
+
+
+class TestDeleteImages():
+
+    @pytest.fixture
+    def fileset(self, client, db_fileset):
+        db_fileset.complete = True
+        client.add_images_to_fileset(db_fileset.uuid, [
+            {'uuid': f'image{i}', 'name': f'image{i}', 'pyramid_levels': 1,
+             'tile_size': 1024}
+            for i in range(4)
+        ])
+        return db_fileset.uuid
+
+    def deleted(self, session):
+        return sorted(uuid for uuid, in session.query(Image.uuid)
+                      .filter(Image.deleted.is_(True)))
+
+    def test_delete_images(self, client, session, fileset):
+        assert 2 == client.delete_images(['image0', 'image1', 'nonexistant'])
+        assert ['image0', 'image1'] == self.deleted(session)
+        assert ['image2'] == client.delete_images(['image1', 'image2'],
+                                                  return_uuids=True)
+        assert ['image0', 'image1', 'image2'] == self.deleted(session)
+
+    def test_restore_images(self, client, session, fileset):
+        client.delete_images(['image0', 'image1', 'image2'])
+        assert 2 == client.restore_images(['image0', 'image1', 'image3'])
+        assert ['image2'] == self.deleted(session)
+        assert ['image2'] == client.restore_images(['image2'],
+                                                   return_uuids=True)
+        assert [] == self.deleted(session)
+
+    def test_delete_images_in_fileset(self, client, session, fileset):
+        client.delete_images(['image0'])
+        assert ['image1', 'image2', 'image3'] == sorted(
+            client.delete_images_in_fileset(fileset, return_uuids=True)
+        )
+        assert 0 == client.delete_images_in_fileset(fileset)
+        assert ['image0', 'image1', 'image2', 'image3'] == self.deleted(
+            session
+        )
+
+    def test_delete_images_query_count(self, connection, client, fileset):
+        with statement_log(connection) as statements:
+            client.delete_images([f'image{i}' for i in range(4)])
+            assert len(statements) == 1
+
+
+class TestPurge():
+
+    @pytest.fixture
+    def hierarchy(self, client, session, user_granted_read_hierarchy):
+        hierarchy = user_granted_read_hierarchy
+        hierarchy['fileset'].complete = True
+        client.add_images_to_fileset(hierarchy['fileset_uuid'], [
+            {'uuid': f'image-purge{i}', 'name': f'image-purge{i}',
+             'pyramid_levels': 1, 'tile_size': 1024}
+            for i in range(3)
+        ], {'channels': []})
+        return hierarchy
+
+    def test_purge(self, client, session, hierarchy):
+        client.delete_image('image-purge0')
+        client.delete_image('image-purge1')
+        batches = list(client.purge_deleted_images(batch_size=1))
+        assert [['image-purge0'], ['image-purge1']] == [
+            [image['uuid'] for image in batch['data']] for batch in batches
+        ]
+        assert all([] == batch['included']['keys'] for batch in batches)
+        assert {hierarchy['image_uuid'], 'image-purge2'} == {
+            uuid for uuid, in session.query(Image.uuid)
+        }
+        assert ['image-purge2'] == [
+            uuid for uuid, in session.query(RenderingSettings.image_uuid)
+        ]
+
+    def test_purge_keys(self, client, session, hierarchy):
+        image_uuids = [hierarchy['image_uuid'], 'image-purge0',
+                       'image-purge1', 'image-purge2']
+        for image_uuid in image_uuids:
+            client.delete_image(image_uuid)
+        batch, = client.purge_deleted_images()
+        assert sorted(image_uuids) == [image['uuid']
+                                       for image in batch['data']]
+        assert [{
+            'key': hierarchy['key'].key,
+            'import_uuid': hierarchy['import_uuid'],
+            'fileset_uuid': hierarchy['fileset_uuid']
+        }] == batch['included']['keys']
+        assert 0 == session.query(Image).count()
+        assert 1 == session.query(Key).count()
+
+    def test_purge_keys_last_batch(self, client, session, hierarchy):
+        for image_uuid in [hierarchy['image_uuid'], 'image-purge0',
+                           'image-purge1', 'image-purge2']:
+            client.delete_image(image_uuid)
+        batches = client.purge_deleted_images(batch_size=2)
+        # The other deleted images could still be restored
+        assert [] == next(batches)['included']['keys']
+        assert [hierarchy['key'].key] == [
+            key['key'] for key in next(batches)['included']['keys']
+        ]
+        assert [] == list(batches)
+
+    def test_purge_stopped(self, client, session, hierarchy):
+        client.delete_image('image-purge0')
+        client.delete_image('image-purge1')
+        batches = client.purge_deleted_images(batch_size=1)
+        next(batches)
+        batches.close()
+        assert 4 == session.query(Image).count()
+
+    def test_purge_skip_locked(self, connection, client, hierarchy):
+        client.delete_image('image-purge0')
+        with statement_log(connection) as statements:
+            list(client.purge_deleted_images())
+            assert str(statements[0].compile(
+                dialect=postgresql.dialect()
+            )).endswith('FOR UPDATE SKIP LOCKED')
+
+    def test_purge_invalid_batch_size(self, client):
+        with pytest.raises(ValueError):
+            client.purge_deleted_images(batch_size=0)
+
+
+class TestKeyPages():
+
+    @pytest.fixture
+    def keys(self, session, user_granted_read_hierarchy):
+        import_ = user_granted_read_hierarchy['import_']
+        fileset = user_granted_read_hierarchy['fileset']
+        keys = [user_granted_read_hierarchy['key']] + [
+            KeyFactory(import_=import_, fileset=fileset) for _ in range(4)
+        ]
+        session.add_all(keys)
+        session.commit()
+        return sorted(
+            (sa_obj_to_dict(key, ('key', 'import_uuid', 'fileset_uuid'))
+             for key in keys),
+            key=lambda d: d['key']
+        )
+
+    @pytest.fixture(params=['import', 'fileset'])
+    def list_keys(self, request, client, user_granted_read_hierarchy):
+        if request.param == 'import':
+            uuid = user_granted_read_hierarchy['import_uuid']
+            return lambda **kwargs: client.list_keys_in_import(uuid, **kwargs)
+        uuid = user_granted_read_hierarchy['fileset_uuid']
+        return lambda **kwargs: client.list_keys_in_fileset(uuid, **kwargs)
+
+    @pytest.mark.parametrize('limit,pages', [(1, 5), (2, 3), (5, 1),
+                                             (6, 1)])
+    def test_pages(self, keys, list_keys, limit, pages):
+        data = []
+        cursor = None
+        for _ in range(pages):
+            page = list_keys(limit=limit, cursor=cursor)
+            assert len(page['data']) <= limit
+            data.extend(page['data'])
+            cursor = page['links']['next']
+        assert cursor is None
+        assert keys == data
+
+    def test_no_limit(self, keys, list_keys):
+        assert 'links' not in list_keys()
+
+    @pytest.mark.parametrize('cursor', ['invalid', 'WyJhIl0=', 'e30='])
+    def test_invalid_cursor(self, keys, list_keys, cursor):
+        with pytest.raises(ValueError):
+            list_keys(limit=1, cursor=cursor)
+
+    def test_invalid_limit(self, keys, list_keys):
+        with pytest.raises(ValueError):
+            list_keys(limit=0)
+
+    def test_index_range_scan(self, connection, keys, list_keys):
+        cursor = list_keys(limit=2)['links']['next']
+        # The tables are tiny, so only an index scan shows the index is used
+        connection.execute('SET LOCAL enable_seqscan = off')
+        try:
+            with query_plans(connection) as plans:
+                list_keys(limit=2, cursor=cursor)
+        finally:
+            connection.execute('SET LOCAL enable_seqscan = on')
+        assert 1 == len(plans)
+        assert 'Index' in plans[0]
+        assert 'Sort' not in plans[0]
+
+
+class TestChunks():
+
+    @pytest.fixture
+    def hierarchy(self, session, user_granted_read_hierarchy):
+        import_ = user_granted_read_hierarchy['import_']
+        fileset = user_granted_read_hierarchy['fileset']
+        session.add_all([KeyFactory(import_=import_, fileset=fileset)
+                         for _ in range(4)])
+        session.commit()
+        return user_granted_read_hierarchy
+
+    @pytest.mark.parametrize('name,uuid_key', [
+        ('imports_in_repository', 'repository_uuid'),
+        ('filesets_in_import', 'import_uuid'),
+        ('keys_in_import', 'import_uuid'),
+        ('images_in_fileset', 'fileset_uuid'),
+        ('images_in_repository', 'repository_uuid'),
+        ('keys_in_fileset', 'fileset_uuid')
+    ])
+    @pytest.mark.parametrize('chunk_size', [1, 2, 1000])
+    def test_matches_list(self, client, hierarchy, name, uuid_key,
+                          chunk_size):
+        uuid = hierarchy[uuid_key]
+        chunks = list(getattr(client, f'iter_{name}')(uuid, chunk_size))
+        assert all(len(chunk) == chunk_size for chunk in chunks[:-1])
+        assert 0 < len(chunks[-1]) <= chunk_size
+        data = [d for chunk in chunks for d in chunk]
+        expected = getattr(client, f'list_{name}')(uuid)['data']
+
+        def sort_key(d):
+            return sorted(d.items())
+
+        assert sorted(expected, key=sort_key) == sorted(data, key=sort_key)
+
+    def test_empty(self, client):
+        assert [] == list(client.iter_keys_in_import('missing'))
+
+    def test_server_side_cursor(self, connection, client, hierarchy):
+        cursor_names = []
+
+        def before_cursor_execute(conn, cursor, *args):
+            cursor_names.append(cursor.name)
+
+        event.listen(connection, 'before_cursor_execute',
+                     before_cursor_execute)
+        try:
+            list(client.iter_keys_in_import(hierarchy['import_uuid'], 2))
+        finally:
+            event.remove(connection, 'before_cursor_execute',
+                         before_cursor_execute)
+        assert 1 == len(cursor_names)
+        assert cursor_names[0] is not None
+
+    def test_invalid_chunk_size(self, client):
+        with pytest.raises(ValueError):
+            client.iter_keys_in_import('missing', 0)
+
 
 class TestImage():
 
@@ -395,6 +934,20 @@ class TestImage():
             client.get_image(image_uuid)
             assert len(statements) == 2
 
+    def test_get_image_as_json(self, connection, client, db_image):
+        image_uuid = db_image.uuid
+        client.create_rendering_settings('rendering_settings1', image_uuid,
+                                         [Channel('1', 'DNA', '0000FF', 0, 1)
+                                          .as_dict()], 'DNA')
+        with statement_log(connection) as statements:
+            document = client.get_image(image_uuid, as_json=True)
+            assert len(statements) == 1
+        assert client.get_image(image_uuid) == json.loads(document)
+
+    def test_get_image_as_json_nonexistant(self, client):
+        with pytest.raises(NoResultFound):
+            client.get_image('nonexistant', as_json=True)
+
     def test_list_images_in_fileset(self, client,
                                     user_granted_read_hierarchy):
         keys = ('uuid', 'name', 'pyramid_levels', 'fileset_uuid', 'repository_uuid')
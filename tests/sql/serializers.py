@@ -0,0 +1,83 @@
+import json
+import pytest
+from src.minerva_db.sql import serializers
+from src.minerva_db.sql.serializers import compiled
+from src.minerva_db.sql.models.renderingsettings import Channel
+
+SCHEMAS = [
+    'membership_schema', 'memberships_schema',
+    'grant_schema', 'grants_schema',
+    'group_schema', 'groups_schema',
+    'user_schema', 'users_schema',
+    'repository_schema', 'repositories_schema',
+    'import_schema', 'imports_schema',
+    'fileset_schema', 'filesets_schema',
+    'image_schema', 'images_schema',
+    'key_schema', 'keys_schema',
+    'rendering_settings_schema'
+]
+
+
+@pytest.fixture
+def db_rendering_settings(client, db_image):
+    channels = [Channel('1', 'DNA', '0000FF', 0.2, 0.5).as_dict()]
+    client.create_rendering_settings('rendering_settings1', db_image.uuid,
+                                     channels)
+    return db_image.rendering_settings
+
+
+# The objects to serialize with each schema
+@pytest.fixture
+def objects(db_membership, user_granted_repository, db_group,
+            db_user, db_repository, db_import_with_keys, db_fileset,
+            db_fileset_incomplete, db_image, db_rendering_settings):
+    return {
+        'Membership': [db_membership],
+        'Grant': user_granted_repository.grants,
+        'Group': [db_group, db_membership.group],
+        'User': [db_user, db_membership.user],
+        'Repository': [db_repository, user_granted_repository],
+        'Import': [db_import_with_keys, db_fileset.import_],
+        'Fileset': [db_fileset, db_fileset_incomplete],
+        'Image': [db_image],
+        'Key': db_import_with_keys.keys,
+        'RenderingSettings': db_rendering_settings
+    }
+
+
+@pytest.mark.parametrize('name', SCHEMAS)
+class TestCompiledSchema():
+
+    def test_fields(self, name):
+        schema = getattr(serializers, name)
+        compiled_schema = getattr(compiled, name)
+        # The order of marshmallow's fields varies with the hash seed
+        assert sorted(schema.dump_fields) == sorted(
+            key for key, _ in compiled_schema.fields()
+        )
+
+    def test_dump(self, name, objects):
+        schema = getattr(serializers, name)
+        compiled_schema = getattr(compiled, name)
+        objs = objects[compiled_schema.model.__name__]
+        if not compiled_schema.many:
+            objs = objs[0]
+        assert json.dumps(schema.dump(objs), sort_keys=True) == json.dumps(
+            compiled_schema.dump(objs), sort_keys=True
+        )
+
+    def test_dump_rows(self, name, session, objects):
+        compiled_schema = getattr(compiled, name)
+        objs = objects[compiled_schema.model.__name__]
+        rows = [
+            session.query(*compiled_schema.columns())
+            .filter(*[column == getattr(obj, column.key)
+                      for column in compiled_schema.model.__table__
+                      .primary_key])
+            .one()
+            for obj in objs
+        ]
+        assert compiled.CompiledSchema(compiled_schema.model,
+                                       compiled_schema.include_fk,
+                                       many=True).dump(objs) \
+            == compiled_schema.dump_rows(rows)
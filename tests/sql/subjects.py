@@ -1,3 +1,4 @@
+import json
 import pytest
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm.exc import NoResultFound
@@ -138,6 +139,22 @@ class TestMembership():
             client.get_membership(group_uuid, user_uuid)
             assert len(statements) == 1
 
+    def test_get_membership_as_json(self, connection, client, db_membership):
+        group_uuid = db_membership.group_uuid
+        user_uuid = db_membership.user_uuid
+        with statement_log(connection) as statements:
+            document = client.get_membership(group_uuid, user_uuid,
+                                             as_json=True)
+            assert len(statements) == 1
+        assert client.get_membership(group_uuid, user_uuid) == json.loads(
+            document
+        )
+
+    def test_get_membership_as_json_nonexistant(self, client, db_user,
+                                                db_group):
+        with pytest.raises(NoResultFound):
+            client.get_membership(db_group.uuid, db_user.uuid, as_json=True)
+
     def test_update_membership(self, client, session, db_user, db_group):
         keys = ['user_uuid', 'group_uuid', 'membership_type']
         db_membership = MembershipFactory(group=db_group, user=db_user,
@@ -174,6 +191,15 @@ class TestMembership():
     def test_is_owner(self, client, db_ownership):
         assert client.is_owner(db_ownership.group_uuid, db_ownership.user_uuid)
 
+    def test_owner_is_member(self, client, db_ownership):
+        assert client.is_member(db_ownership.group_uuid,
+                                db_ownership.user_uuid)
+
+    def test_is_member_invalid(self, client, db_membership):
+        with pytest.raises(ValueError):
+            client.is_member(db_membership.group_uuid,
+                             db_membership.user_uuid, 'Admin')
+
     def test_isnt_owner(self, client, db_membership):
         assert not client.is_owner(db_membership.group_uuid,
                                    db_membership.user_uuid)
@@ -1,4 +1,7 @@
-from src.minerva_db.sql.api.utils import to_jsonapi
+import io
+import json
+from src.minerva_db.sql.api.utils import (to_jsonapi, iter_jsonapi,
+                                          dump_jsonapi)
 
 
 class TestUtils():
@@ -28,3 +31,27 @@ class TestUtils():
             'data': data,
             'included': included
         }
+
+    def test_iter_jsonapi(self):
+        data = [{'x': i, 'y': f'foo "{i}"é'} for i in range(1000)]
+        included = {'extras': [{'a': 'A'}]}
+        expected = json.dumps(to_jsonapi(data, included)).encode()
+        chunks = list(iter_jsonapi(iter(data), included, chunk_size=1024))
+        assert 1 < len(chunks)
+        assert expected == b''.join(chunks)
+
+    def test_iter_jsonapi_empty(self):
+        assert json.dumps(to_jsonapi([])).encode() == b''.join(
+            iter_jsonapi(iter([]))
+        )
+
+    def test_iter_jsonapi_links(self):
+        links = {'next': None}
+        assert json.dumps(to_jsonapi([{'x': 1}], links=links)).encode() \
+            == b''.join(iter_jsonapi([{'x': 1}], links=links))
+
+    def test_dump_jsonapi(self):
+        data = [{'x': 1}, {'x': 2}]
+        fp = io.BytesIO()
+        dump_jsonapi(fp, iter(data))
+        assert json.dumps(to_jsonapi(data)).encode() == fp.getvalue()